@@ -18,19 +18,17 @@ def read_swf(trace_path):
     Returns:
         A list of lists, where each inner list represents a processed line of input.
     """
-    data = []
-
-    with open(f'{trace_path}', 'r') as file:
-        for line in file:
-        
-            # TODO: For now ignoring the header of the swf file
-            if line[0] == ';':
-                continue
-
-            # Split the line into elements, convert non-empty elements to integers
-            row = [int(x) for x in line.split() if x]
-            data.append(row)
-    df = pd.DataFrame(data, columns=swf_columns)
+    # Parse the whole file at once, lines starting with ; are the header
+    df = pd.read_csv(
+        trace_path,
+        sep=r'\s+',
+        comment=';',
+        header=None,
+        names=swf_columns,
+        usecols=range(len(swf_columns)),
+        dtype='int64',
+        engine='c'
+    )
     return df
 
 def check_column_sorted(df: pd.DataFrame, column_name: str, ascending: bool = True) -> bool:
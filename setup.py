@@ -14,6 +14,7 @@ setuptools.setup(
     url="",
     packages=setuptools.find_packages(),
     install_requires=[
+        'numpy',
         'pandas',
         'simulus',
         'pandas',
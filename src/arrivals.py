@@ -0,0 +1,171 @@
+"""
+Arrivals
+
+Streams the submit events of a trace in time order.
+
+The simulator only keeps the next arrival on its event list and pulls the one
+after it when that fires, so the pending event list stays small however long
+the trace is.
+
+JobStream does the same for jobs read from an iterator of dataframe chunks,
+e.g. a WorkloadGenerator, and keeps the fields of the jobs in flight only.
+"""
+import copy
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+from input_read import DfFileds
+
+__metaclass__ = type
+
+
+class ArrivalSource:
+
+    def __init__(self, times, job_ids, chunk_size=4096):
+        times = np.asarray(times, dtype=np.int64)
+        job_ids = np.asarray(job_ids, dtype=np.int64)
+
+        # Ties keep the order of the trace
+        order = np.argsort(times, kind='stable')
+        self._times = times[order]
+        self._job_ids = job_ids[order]
+
+        self.chunk_size = chunk_size
+
+        # Arrivals handed out so far
+        self.position = 0
+        self._it = self._generate(0)
+
+    @classmethod
+    def from_events(cls, df_events: pd.DataFrame, chunk_size=4096):
+        """
+        Creates the source from the submit (Q) events of an event dataframe.
+        """
+        df_submit = df_events[df_events[DfFileds.Event.TYPE] == 'Q']
+        return cls(
+            df_submit[DfFileds.Event.TIME].to_numpy(),
+            df_submit[DfFileds.Event.JOB_ID].to_numpy(),
+            chunk_size
+        )
+
+    def __len__(self):
+        return len(self._times)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> tuple[int, int]:
+        arrival = next(self._it)
+        self.position += 1
+        return arrival
+
+    def seek(self, position):
+        """
+        Continues from the arrival at position, in time order.
+        """
+        self.position = position
+        self._it = self._generate(position)
+
+    def copy(self) -> 'ArrivalSource':
+        """
+        Returns a source at the same position sharing the arrival arrays.
+        """
+        source = copy.copy(self)
+        source.seek(self.position)
+        return source
+
+    def first_time(self):
+        """
+        Returns the earliest submit time, None if there are no arrivals.
+        """
+        if len(self._times) == 0:
+            return None
+        return int(self._times[0])
+
+    def _generate(self, start):
+        # Convert to python ints a chunk at a time
+        for i in range(start, len(self._times), self.chunk_size):
+            yield from zip(
+                self._times[i:i + self.chunk_size].tolist(),
+                self._job_ids[i:i + self.chunk_size].tolist()
+            )
+
+
+class JobStream:
+    """
+    Arrival source and job table over chunks of jobs sorted by submit time.
+
+    A job's fields are kept from its arrival until release(), so memory is
+    bounded by the jobs in flight rather than the length of the stream.
+    """
+
+    def __init__(self, chunks: Iterator[pd.DataFrame]):
+        self._chunks = iter(chunks)
+
+        # Job id -> (resources, walltime, runtime) of the arrived jobs not released yet
+        self._jobs: dict[int, tuple[int, int, int]] = {}
+
+        # Jobs pulled from the stream so far
+        self.count = 0
+
+        self._pending = self._next_chunk()
+        self._it = self._generate()
+
+    def _next_chunk(self):
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            return None
+        return [
+            chunk[DfFileds.Job.SUBMIT_TS].tolist(),
+            chunk[DfFileds.Job.ID].tolist(),
+            chunk[DfFileds.Job.REQ_PROC].tolist(),
+            chunk[DfFileds.Job.REQ_T].tolist(),
+            chunk[DfFileds.Job.RUN_T].tolist(),
+        ]
+
+    def _generate(self):
+        jobs = self._jobs
+        while self._pending is not None:
+            columns, self._pending = self._pending, None
+            for t, job_id, resources, walltime, runtime in zip(*columns):
+                jobs[job_id] = (resources, walltime, runtime)
+                self.count += 1
+                yield t, job_id
+            self._pending = self._next_chunk()
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> tuple[int, int]:
+        return next(self._it)
+
+    def first_time(self):
+        """
+        Returns the earliest submit time, None if the stream is empty.
+        """
+        if self._pending is None or len(self._pending[0]) == 0:
+            return None
+        return self._pending[0][0]
+
+    def __contains__(self, job_id):
+        return job_id in self._jobs
+
+    def resources(self, job_id) -> int:
+        return self._jobs[job_id][0]
+
+    def walltime(self, job_id) -> int:
+        return self._jobs[job_id][1]
+
+    def runtime(self, job_id) -> int:
+        return self._jobs[job_id][2]
+
+    def release(self, job_id):
+        """
+        Forgets a job that ended.
+        """
+        del self._jobs[job_id]
@@ -3,58 +3,225 @@ AsyncLoggeer
 
 Create a simple async logger that does not block.
 
+All loggers share one writer thread. Messages are appended to a per logger
+deque, and the writer drains every deque in batches into long-lived buffered
+file handles, flushing them periodically.
+
+Every logger has a level. Messages below it are dropped before anything is
+built, and messages given as a format string with arguments (or a callable)
+are only formatted by the writer thread.
+
+The loggers still open at interpreter exit are drained and closed by an
+atexit hook, the writer thread is a daemon and would drop their queues.
 """
+import atexit
 import threading
-import queue
-import os
+import collections
+import gzip
+
+# Log levels
+DEBUG = 10
+INFO = 20
+WARNING = 30
+OFF = 100
+
+# Defaults for new loggers, see configure()
+_defaults = {
+    # Level of the loggers not listed in levels
+    'level': INFO,
+
+    # Logger name -> level, e.g. {'scheduler': DEBUG}
+    'levels': {},
+
+    # Bytes buffered by each file handle
+    'buffer_size': 1 << 20,
+
+    # Seconds between two drains of the writer thread
+    'flush_interval': 0.5,
+
+    # Write gzip streams, '.gz' is appended to the file name
+    'compress': False,
+}
+
+def configure(buffer_size=None, flush_interval=None, compress=None, level=None, levels=None):
+    """
+    Sets the defaults used by the loggers created after this call.
+    """
+    if level is not None:
+        _defaults['level'] = level
+    if levels is not None:
+        _defaults['levels'] = dict(levels)
+    if buffer_size is not None:
+        _defaults['buffer_size'] = buffer_size
+    if flush_interval is not None:
+        _defaults['flush_interval'] = flush_interval
+    if compress is not None:
+        _defaults['compress'] = compress
 
-class AsyncLogger:
-    def __init__(self, log_file):
-        self.log_file = log_file
 
+class _Writer:
+    """
+    The thread draining every open logger.
+    """
 
-        # Start the tread and create a message queue
-        self.queue = queue.Queue()
-        self.worker_thread = threading.Thread(target=self._worker)
-        self.worker_thread.daemon = True
-        self.worker_thread.start()
+    def __init__(self):
+        self._loggers: set = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: threading.Thread = None
 
-        # Create the log file if it doesn't exist
-        # if not os.path.exists(self.log_file):
-        #     with open(self.log_file, "w") as f:
-        #         f.write('Initialized logger.')
-        #         pass
-        with open(self.log_file, "w") as f:
-            f.write('Initialized logger.\n')
+    def register(self, logger):
+        with self._lock:
+            self._loggers.add(logger)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._worker, name='asynclogger')
+                self._thread.daemon = True
+                self._thread.start()
+
+    def unregister(self, logger):
+        with self._lock:
+            self._loggers.discard(logger)
+        self._wake.set()
 
     def _worker(self):
         """
-        Worker that writes to the log file.
+        Worker that writes all the loggers to their files.
         """
         while True:
+            with self._lock:
+                loggers = list(self._loggers)
+                if not loggers:
+                    # Exit once every logger stopped, the next one starts a new thread
+                    self._thread = None
+                    return
+                interval = min(l.flush_interval for l in loggers)
+
+            for l in loggers:
+                l._drain(flush=True)
+
+            self._wake.wait(interval)
+            self._wake.clear()
+
+    def stop_all(self):
+        """
+        Stops every open logger, writing out what is still queued.
+        """
+        with self._lock:
+            loggers = list(self._loggers)
+        for l in loggers:
+            l.stop()
 
-            message = self.queue.get()
+_writer = _Writer()
+atexit.register(_writer.stop_all)
 
-            # Special message that terminates the thread
-            if message == "$":
-                self.queue.task_done()
-                break
 
-            with open(self.log_file, "a") as f:
-                f.write(message + "\n")
+def _format(item) -> str:
+    if type(item) is str:
+        return item
+    if type(item) is tuple:
+        fmt, args = item
+        return fmt % args
+    return item()
 
 
-    def write_log(self, message):
+class AsyncLogger:
+    def __init__(self, log_file, name=None, level=None, buffer_size=None, flush_interval=None, compress=None, append=False):
+        self.name = name
+        if level is None:
+            level = _defaults['levels'].get(name, _defaults['level'])
+        self.set_level(level)
+
+        self.buffer_size = _defaults['buffer_size'] if buffer_size is None else buffer_size
+        self.flush_interval = _defaults['flush_interval'] if flush_interval is None else flush_interval
+        self.compress = _defaults['compress'] if compress is None else compress
+
+        self.log_file = log_file
+        if self.compress and not self.log_file.endswith('.gz'):
+            self.log_file += '.gz'
+
+        # Messages not written yet, appends and pops are atomic
+        self.queue = collections.deque()
+
+        # Held while writing to the file
+        # With append, the logger continues an existing file, e.g. when resuming from a checkpoint
+        self.append = append
+        self._file_lock = threading.Lock()
+        self._file = self._open()
+        if not append:
+            self._file.write('Initialized logger.\n')
+
+        _writer.register(self)
+
+    def _open(self):
+        mode = 'a' if self.append else 'w'
+        if self.compress:
+            return gzip.open(self.log_file, f'{mode}t', compresslevel=1)
+        return open(self.log_file, mode, buffering=self.buffer_size)
+
+    def _drain(self, flush=False):
+        """
+        Writes the queued messages to the file.
+        """
+        with self._file_lock:
+            if self._file is None:
+                return
+
+            n = len(self.queue)
+            if n > 0:
+                popleft = self.queue.popleft
+                self._file.write('\n'.join([_format(popleft()) for _ in range(n)]))
+                self._file.write('\n')
+
+            if flush:
+                self._file.flush()
+
+    def set_level(self, level):
+        self.level = level
+
+        # Checked by the hot paths before building any message
+        self.debug_enabled = level <= DEBUG
+
+    def is_enabled(self, level) -> bool:
+        return level >= self.level
+
+    def write_log(self, message, level=INFO):
         """
         Puts the log message in a queue for writing to a file.
+        The message is a string or a callable returning one.
+        """
+        if level >= self.level:
+            self.queue.append(message)
+
+    def write_fmt(self, level, fmt, *args):
+        """
+        Puts fmt % args in the queue, the message is formatted by the writer thread.
+        """
+        if level >= self.level:
+            self.queue.append((fmt, args))
+
+    def log_at(self, now, fmt, *args, level=INFO):
+        """
+        Puts fmt % args prefixed with the time now in the queue, formatted by the writer thread.
+        """
+        if level >= self.level:
+            if args:
+                self.queue.append(('%s ' + fmt, (now,) + args))
+            else:
+                self.queue.append(('%s %s', (now, fmt)))
+
+    def flush(self):
+        """
+        Writes the queued messages to the file now.
         """
-        self.queue.put(message)
+        self._drain(flush=True)
 
     def stop(self):
-        """Flush the queue and stop the worker thread."""
+        """Flush the queue and close the file."""
 
-        # The last message in the queue is always the $ , which tells the thread's loop to break.
-        self.write_log("$")
+        _writer.unregister(self)
 
-        # Wait for the thread to exit.
-        self.worker_thread.join()
\ No newline at end of file
+        self._drain()
+        with self._file_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,79 @@
+"""
+Engine benchmark
+
+Replays the bundled traces on every event engine and reports events/sec.
+
+Run from src/:
+    python -m benchmarks.engines --traces pbs theta22 --horizon 86400
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from simulator import Simulator
+from engine import ENGINES
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data')
+
+# Trace name -> (job log, system config)
+TRACES = {
+    'pbs': ('pbs/input/job_log.swf', 'pbs/input/system.json'),
+    'theta22': ('theta22/input/theta22.swf', 'theta22/input/system.json'),
+    'theta23': ('theta23/input/theta23.swf', 'theta23/input/system.json'),
+}
+
+
+def bench_engine(trace, engine, horizon=None) -> dict:
+    """
+    Simulates a bundled trace on one engine, optionally only for horizon seconds of simulated time.
+    """
+    path_job_log, path_system_config = TRACES[trace]
+
+    s = Simulator(engine=engine, allocator_seed=0)
+    s.read_data(os.path.join(DATA_DIR, path_job_log), os.path.join(DATA_DIR, path_system_config))
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        s.initialize(output_dir)
+        until = None if horizon is None else s.now() + horizon
+
+        t = time.perf_counter()
+        s.simulate(until=until)
+        elapsed = time.perf_counter() - t
+
+        s.cleanup()
+
+    events = s.engine.events_processed
+    return {
+        'trace': trace,
+        'engine': engine,
+        'horizon': horizon,
+        'events': events,
+        'seconds': elapsed,
+        'events_per_sec': events / elapsed if elapsed > 0 else float('inf'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Events/sec of every event engine on the bundled traces.')
+    parser.add_argument('--traces', nargs='+', default=list(TRACES), choices=list(TRACES))
+    parser.add_argument('--engines', nargs='+', default=list(ENGINES), choices=list(ENGINES))
+    parser.add_argument('--horizon', type=int, default=None, help='Simulated seconds to run from the first submit')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args()
+
+    results = []
+    for trace in args.traces:
+        for engine in args.engines:
+            r = bench_engine(trace, engine, args.horizon)
+            results.append(r)
+            if not args.json:
+                print(f"{r['trace']:>10} {r['engine']:>8} {r['events']:>10} events {r['seconds']:>9.3f} s {r['events_per_sec']:>12.0f} events/s")
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
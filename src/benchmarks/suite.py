@@ -0,0 +1,160 @@
+"""
+Benchmark suite
+
+Times loading, initializing and simulating a trace, along with the latency of
+the scheduling cycles and the peak memory, on the bundled traces and on
+synthetic swf workloads of any size.
+
+Every case runs in a fresh process so its peak RSS is its own.
+
+Run from src/:
+    python -m benchmarks.suite --traces pbs theta22 --jobs 10000 100000 --nodes 32 1024 --out bench.json
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from benchmarks.engines import DATA_DIR, TRACES
+from input_read import SWF_CACHE_DIR
+from workload import ARRIVALS, WorkloadGenerator
+
+__metaclass__ = type
+
+# Synthetic traces are written once here and reused
+SYNTHETIC_DIR = os.path.join(SWF_CACHE_DIR, 'synthetic')
+
+
+def synthetic_trace(jobs, nodes, arrival='poisson', load=0.8, seed=0) -> str:
+    """
+    Returns the path of a synthetic trace, writing it if it does not exist yet.
+    """
+    os.makedirs(SYNTHETIC_DIR, exist_ok=True)
+    path = os.path.join(SYNTHETIC_DIR, f'synthetic_{arrival}_j{jobs}_n{nodes}_l{load}_s{seed}.swf')
+    if not os.path.exists(path):
+        # Write to a temporary file first so an interrupted run leaves no partial trace
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        WorkloadGenerator(nodes, jobs, arrival=arrival, load=load, seed=seed).write_swf(tmp_path)
+        os.replace(tmp_path, path)
+    return path
+
+
+def bench_trace(case, path_job_log, path_system_config=None, options=None) -> dict:
+    """
+    Loads, initializes and simulates one trace and returns the timings.
+    The system config is read from the swf header if not given.
+    """
+    from simulator import Simulator
+
+    rss_start = _peak_rss_mb()
+    s = Simulator(allocator_seed=0, **(options or {}))
+
+    t = time.perf_counter()
+    if path_system_config is None:
+        s.read_data_swf(path_job_log)
+    else:
+        s.read_data(path_job_log, path_system_config)
+    t_load = time.perf_counter() - t
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        t = time.perf_counter()
+        s.initialize(output_dir)
+        t_init = time.perf_counter() - t
+
+        t = time.perf_counter()
+        s.simulate()
+        t_simulate = time.perf_counter() - t
+
+        t = time.perf_counter()
+        s.cleanup()
+        t_flush = time.perf_counter() - t
+
+    events = s.engine.events_processed
+    scheduler = s.scheduler
+    return {
+        'case': case,
+        'trace': path_job_log,
+        'jobs': len(s.jobs),
+        'nodes': s.system_config.nodes,
+        'events': events,
+        't_load': t_load,
+        't_init': t_init,
+        't_simulate': t_simulate,
+        't_flush': t_flush,
+        'events_per_sec': events / t_simulate if t_simulate > 0 else None,
+        'cycles': scheduler.cycles,
+        'cycle_time_mean': scheduler.cycle_time / scheduler.cycles if scheduler.cycles else None,
+        'cycle_time_max': scheduler.cycle_time_max,
+        'cycle_share': scheduler.cycle_time / t_simulate if t_simulate > 0 else None,
+        'rss_start_mb': rss_start,
+        'peak_rss_mb': _peak_rss_mb(),
+    }
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def run_isolated(fn, *args) -> dict:
+    """
+    Runs fn(*args) in a new process and returns its result, or the error.
+    """
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+        try:
+            return pool.submit(fn, *args).result()
+        except Exception as e:
+            return {'case': args[0], 'error': repr(e)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the simulator on bundled and synthetic traces.')
+    parser.add_argument('--traces', nargs='*', default=['pbs'], choices=list(TRACES), help='Bundled traces')
+    parser.add_argument('--jobs', nargs='*', type=int, default=[10_000], help='Synthetic trace sizes, none to skip')
+    parser.add_argument('--nodes', nargs='*', type=int, default=[32, 1024], help='Synthetic system sizes')
+    parser.add_argument('--arrival', default='poisson', choices=list(ARRIVALS), help='Arrival process of the synthetic traces')
+    parser.add_argument('--load', type=float, default=0.8, help='Offered load of the synthetic traces')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic traces')
+    parser.add_argument('--engine', default='heap')
+    parser.add_argument('--out', default=None, help='Write the results as JSON to this file instead of stdout')
+    args = parser.parse_args()
+
+    options = {'engine': args.engine}
+    cases = []
+    for trace in args.traces:
+        path_job_log, path_system_config = TRACES[trace]
+        cases.append((trace, os.path.join(DATA_DIR, path_job_log), os.path.join(DATA_DIR, path_system_config)))
+    for jobs in args.jobs:
+        for nodes in args.nodes:
+            cases.append((f'{args.arrival}_j{jobs}_n{nodes}', synthetic_trace(jobs, nodes, args.arrival, args.load, args.seed), None))
+
+    # Progress goes to stderr so stdout is only the JSON report
+    results = []
+    for case, path_job_log, path_system_config in cases:
+        r = run_isolated(bench_trace, case, path_job_log, path_system_config, options)
+        results.append(r)
+        if 'error' in r:
+            print(f'{case:>28} failed: {r["error"]}', file=sys.stderr)
+        else:
+            # NOTE: Both are None for a case that ran no events or no scheduling cycles
+            rate = f'{r["events_per_sec"]:>10.0f}' if r['events_per_sec'] is not None else f'{"-":>10}'
+            cycle = f'{r["cycle_time_mean"] * 1e6:>9.1f}' if r['cycle_time_mean'] is not None else f'{"-":>9}'
+            print(f'{case:>28} {rate} events/s {cycle} us/cycle {r["peak_rss_mb"]:>8.1f} MB', file=sys.stderr)
+
+    report = {
+        'engine': args.engine,
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+    if args.out is None:
+        print(json.dumps(report, indent=2))
+    else:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
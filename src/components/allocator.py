@@ -1,17 +1,18 @@
 from dataclasses import dataclass
-from enum import Enum
-import random
-from asynclogger import AsyncLogger
+from enum import IntEnum
+import numpy as np
+from asynclogger import AsyncLogger, DEBUG, INFO
+from components.availability import AvailabilityWindow
 
 __metaclass__ = type
 
-class ResourceState(Enum):
+class ResourceState(IntEnum):
     BUSY = 1
     OFFLINE = 2
     AVAILABLE = 3
 
 
-@dataclass
+@dataclass(slots=True)
 class Resource:
 
     # These stay the same
@@ -24,170 +25,311 @@ class Resource:
     job_id: int
 
 
+def encode_ranges(resource_ids) -> str:
+    """
+    Encodes resource ids as sorted ranges, e.g. [7, 0, 1, 2, 3, 9, 10] -> "0-3;7;9-10".
+    """
+    ids = np.sort(np.asarray(resource_ids, dtype=np.int64))
+    if len(ids) == 0:
+        return ''
+
+    # Split wherever the ids are not consecutive
+    breaks = np.flatnonzero(np.diff(ids) != 1) + 1
+    starts = ids[np.concatenate(([0], breaks))].tolist()
+    ends = ids[np.concatenate((breaks - 1, [len(ids) - 1]))].tolist()
+
+    return ';'.join(str(a) if a == b else f'{a}-{b}' for a, b in zip(starts, ends))
+
+def decode_ranges(s: str) -> np.ndarray:
+    """
+    Decodes ranges written by encode_ranges back into resource ids.
+    """
+    ids = []
+    for r in s.split(';'):
+        if not r:
+            continue
+        a, _, b = r.partition('-')
+        ids.append(np.arange(int(a), int(b or a) + 1, dtype=np.int64))
+    if not ids:
+        return np.empty(0, dtype=np.int64)
+    return np.concatenate(ids)
+
+
 class Allocator:
-    def __init__(self, simulator, num_resources, log_dir):
-        self.logger = AsyncLogger(f'{log_dir}/allocator.log')
-        self.logger.write_log(f'Initialized Allocator')
+
+    # Placement policies understood by allocate()
+    PLACEMENTS = ('random', 'lifo')
+
+    def __init__(self, simulator, num_resources, log_dir, placement='random', seed=None, append_log=False):
+        self.logger = AsyncLogger(f'{log_dir}/allocator.log', name='allocator', append=append_log)
+        if not append_log:
+            self.logger.write_log(f'Initialized Allocator')
 
         self.simulator = simulator
 
-        self.resources: list[Resource] = []
+        if placement not in self.PLACEMENTS:
+            raise ValueError(f'Unknown placement {placement}, expected one of {self.PLACEMENTS}')
 
-        for i in range(0, num_resources):
-            n = Resource(
-                id = i,
-                name = f'resource_{i}',
-                cpus=1,
-                state = ResourceState.AVAILABLE,
-                job_id=-1
-            )
-            self.resources.append(n)
+        self.num_resources = num_resources
+        self.placement = placement
+        self.rng = np.random.default_rng(seed)
 
-    
-    def log(self, s):
-        self.logger.write_log(f'{self.simulator.now()} {s}')
+        # State of every resource, indexed by resource id
+        self._state = np.full(num_resources, ResourceState.AVAILABLE.value, dtype=np.int8)
+        self._job_id = np.full(num_resources, -1, dtype=np.int64)
+
+        # Free list: the first _num_free entries of _free are the available resource ids
+        self._free = np.arange(num_resources, dtype=np.int64)
+        self._num_free = num_resources
+        self._num_offline = 0
+
+        # Job id -> ids of the resources allocated to it
+        self._job_resources: dict[int, np.ndarray] = {}
+
+        # Integral of the busy resources over time since _t0, up to _t_last
+        self._t0 = None
+        self._t_last = None
+        self._busy_seconds = 0
+
+
+    def log(self, fmt, *args, level=INFO):
+        self.logger.log_at(self.simulator.now(), fmt, *args, level=level)
+
+    def debug(self, fmt, *args):
+        if self.logger.debug_enabled:
+            self.logger.log_at(self.simulator.now(), fmt, *args, level=DEBUG)
 
 
     def get_resource(self, resource_id) -> Resource:
         """
         Returns a resource given and id.
         """
-        for n in self.resources:
-            if n.id == resource_id:
-                return n
+        if resource_id < 0 or resource_id >= self.num_resources:
+            return None
+        return Resource(
+            id = resource_id,
+            name = f'resource_{resource_id}',
+            cpus = 1,
+            state = ResourceState(self._state[resource_id]),
+            job_id = int(self._job_id[resource_id])
+        )
 
     def get_available(self) -> list[Resource]:
         """
         Returns the available resource.
         """
-        return [n for n in self.resources if n.state == ResourceState.AVAILABLE]
+        return [self.get_resource(i) for i in self.available_ids().tolist()]
     
     def get_all_busy(self) -> list[Resource]:
         """
         Returns all busy resources.
         """
-        return [n for n in self.resources if n.state == ResourceState.BUSY]
+        busy = np.flatnonzero(self._state == ResourceState.BUSY.value)
+        return [self.get_resource(i) for i in busy.tolist()]
     
     def get_busy(self, job_id) -> list[Resource]:
         """
         Returns busy resources for some job.
         """
-        return [n for n in self.resources if n.state == ResourceState.BUSY and n.job_id == job_id]
+        return [self.get_resource(i) for i in self.get_job_resources(job_id).tolist()]
     
     def get_offline(self) -> list[Resource]:
         """
         Returns the offline resources.
         """
-        return [n for n in self.resources if n.state == ResourceState.OFFLINE]
+        offline = np.flatnonzero(self._state == ResourceState.OFFLINE.value)
+        return [self.get_resource(i) for i in offline.tolist()]
 
+    def available_ids(self) -> np.ndarray:
+        """
+        Returns the ids of the available resources.
+        """
+        return self._free[:self._num_free].copy()
 
-    def allocate(self, job_id, resources) -> list[int] | None:
+    def get_job_resources(self, job_id) -> np.ndarray:
+        """
+        Returns the ids of the resources allocated to some job.
+        """
+        return self._job_resources.get(job_id, np.empty(0, dtype=np.int64))
+
+    def num_available(self) -> int:
+        """
+        Returns the number of available resources.
+        """
+        return self._num_free
+
+    def num_busy(self) -> int:
+        """
+        Returns the number of busy resources.
+        """
+        return self.num_resources - self._num_free - self._num_offline
+
+
+    def allocate(self, job_id, resources) -> np.ndarray | None:
         """
         Allocates a num_resources amount of resources to some job_id.
-        Returns the ids of the resources allocated.
+        Returns the ids of the resources allocated, an array the allocator
+        keeps until deallocate(), so do not modify it. Returns None if not
+        enough resources are free.
         """
 
-        avaliable_resources = self.get_available()
+        if resources <= 0:
+            raise ValueError(f'Job {job_id} requests {resources} resources, expected at least 1')
 
-        if resources > len(avaliable_resources):
+        if resources > self._num_free:
             return None
-        
-        alloc_resources = random.sample(avaliable_resources, resources)
 
-        for n in alloc_resources:
-            n.state = ResourceState.BUSY
-            n.job_id = job_id
-            self.simulator.create_alloc_event(n.id)
+        if job_id in self._job_resources:
+            raise ValueError(f'Job {job_id} already has resources allocated')
+
+        self._advance()
+        alloc_resources = self._take_free(resources)
+
+        self._state[alloc_resources] = ResourceState.BUSY.value
+        self._job_id[alloc_resources] = job_id
+        self._job_resources[job_id] = alloc_resources
 
-        self.log(f'Job {job_id}: Allocated with {resources} resources.')
-        return [n.id for n in alloc_resources]
+        self.simulator.create_alloc_event(job_id, alloc_resources)
+
+        self.log('Job %s: Allocated with %s resources.', job_id, resources)
+        return alloc_resources
 
     def deallocate(self, job_id) -> None:
         """
         Deallocates resources for some job_id.
+        Raises ValueError if the job has no resources allocated.
         """
 
-        dealloc_resources = self.get_busy(job_id)
+        dealloc_resources = self._job_resources.pop(job_id, None)
+        if dealloc_resources is None:
+            raise ValueError(f'Job {job_id} has no resources allocated')
+
+        self._advance()
+        self._state[dealloc_resources] = ResourceState.AVAILABLE.value
+        self._job_id[dealloc_resources] = -1
+        self._put_free(dealloc_resources)
 
-        for n in dealloc_resources:
-            n.state = ResourceState.AVAILABLE
-            n.job_id = -1
-            self.simulator.create_dealloc_event(n.id)
+        self.simulator.create_dealloc_event(job_id, dealloc_resources)
         
-        self.log(f'Job {job_id}: Deallocated {len(dealloc_resources)} resources.')
+        self.log('Job %s: Deallocated %s resources.', job_id, len(dealloc_resources))
 
+    def _take_free(self, k) -> np.ndarray:
+        """
+        Removes k resources from the free list and returns their ids.
+        """
+        n = self._num_free
+        tail_start = n - k
+
+        if k == 0:
+            return np.empty(0, dtype=np.int64)
+
+        if self.placement == 'lifo':
+            # Most recently freed resources sit at the tail of the free list
+            taken = self._free[tail_start:n].copy()
+        else:
+            # Pick k positions of the free list uniformly at random, then fill the
+            # holes they leave below the tail with the tail entries not picked
+            picked = self.rng.choice(n, size=k, replace=False)
+            taken = self._free[picked]
+
+            holes = picked[picked < tail_start]
+            if len(holes) > 0:
+                in_tail = np.zeros(k, dtype=bool)
+                in_tail[picked[picked >= tail_start] - tail_start] = True
+                fill = np.flatnonzero(~in_tail) + tail_start
+                self._free[holes] = self._free[fill]
+
+        self._num_free = tail_start
+        return taken
+
+    def _put_free(self, resource_ids: np.ndarray) -> None:
+        """
+        Appends resources to the tail of the free list.
+        """
+        n = self._num_free
+        k = len(resource_ids)
+        self._free[n:n + k] = resource_ids
+        self._num_free = n + k
 
-    def reserve_future(self, trm, job_id, resources, walltime) -> dict[int, int]:
-        # print(f'\tReserve top job, {job_id}:')
-        self.log(f'Job {job_id}: Trying to reserve {resources} resources for {walltime} in future.')
 
-        reservation_time = -1
-        # Iterate over the times when resources are getting freed up
-        for t in trm:
+    def reserve_future(self, window: AvailabilityWindow, job_id, resources, walltime) -> AvailabilityWindow | None:
+        self.debug('Job %s: Trying to reserve %s resources for %s in future.', job_id, resources, walltime)
 
-            # Get the total resources available at this time
-            resource_pool = [self.get_resource(resource_id) for resource_id in trm[t]]
-            
-            self.log(f'TRM: Time {t}; Available {len(resource_pool)}')
+        # Find the first time when enough resources are getting freed up
+        i = window.earliest(resources)
+        if i == -1:
+            # Only happens when a jobs are exceeding their walltime, or their end event has not occured
+            self.debug('Job %s: Found reservation time of -1.', job_id)
+            return None
 
-            # Once reourrces are available break
-            if len(resource_pool) >= resources:
-                reservation_time = t
-                break
+        reservation_time = window.times[i]
+        self.debug('Job %s: Found reservation time of %s. Available %s.', job_id, reservation_time, window.counts[i])
 
-        self.log(f'Job {job_id}: Found reservation time of {reservation_time}.')
+        # Hold the resources from the reservation time until the job would end
+        window.reserve(resources, reservation_time, reservation_time + walltime)
 
+        return window
+    
+    def reserve_now(self, window: AvailabilityWindow, job_id, resources, walltime) -> AvailabilityWindow:
+        self.debug('Reserve Now: Job %s: Reserving %s resources for %s starting now.', job_id, resources, walltime)
 
-        # Only happens when a jobs are exceeding their walltime, or their end event has not occured
-        if reservation_time == -1:
-            return None
+        now = self.simulator.now()
+        window.reserve(resources, now, now + walltime)
 
-        # For the found reservation time get resources to reserve
-        # NOTE: Cannot remove random ones because we want max of the same resource ids to be free at all times
-        # reserved_resources = random.sample(time_resource_map[reservation_time], resources)
-        # NOTE: Instead remove from the end of the list
-        reserved_resources = trm[reservation_time][-resources:]
-        end_time = reservation_time + walltime
+        return window
+        
+    
+    def start_accounting(self, t):
+        """
+        Starts the busy resource integral at time t.
+        """
+        self._t0 = t
+        self._t_last = t
+        self._busy_seconds = 0
 
+    def _advance(self):
+        """
+        Adds the busy resources since the last change to the integral, call before changing them.
+        """
+        now = self.simulator.now()
+        if self._t0 is None:
+            self.start_accounting(now)
+        self._busy_seconds += self.num_busy() * (now - self._t_last)
+        self._t_last = now
 
-        # print(f'\t\tReservation time: {reservation_time}')
-        # print(f'\t\tReserved resources: {reserved_resources}')
+    def busy_node_seconds(self):
+        """
+        Returns the integral of the busy resources over time, up to now.
+        """
+        if self._t0 is None:
+            return 0
+        return self._busy_seconds + self.num_busy() * (self.simulator.now() - self._t_last)
 
-        # Remove those resources from the time resource map
-        for t in trm:
-            # print(f'\t\tFor time: {t}')
-            if reservation_time <= t and end_time >= t:
-                self.log(f'Job {job_id}: Attempting to reserve at {t}. Avialable: {len(trm[t])}')
-                for r in reserved_resources:
-                    # print(f'\t\t\t\tRemoving: {r}')
-                    trm[t].remove(r)
+    def average_utilization(self):
+        """
+        Returns the time weighted utilization since the start of accounting.
+        """
+        if self._t0 is None:
+            return 0
+        elapsed = self.simulator.now() - self._t0
+        if elapsed <= 0:
+            return self.resource_utilization()
+        return self.busy_node_seconds()/(self.num_resources * elapsed)
 
-        # Return the updated time resource map
-        return trm
-    
-    def reserve_now(self, trm, job_id, resources, walltime) -> dict[int, int]:
-        self.log(f'Reserve Now: Job {job_id}: Trying to reserve {resources} resources for {walltime} starting now.')
-
-        for t in trm:
-            self.log(f'Resernve Now: Job {job_id}: Attempting to reserve {resources} resources for {walltime} starting now.')
-            if t > self.simulator.now() + walltime:
-                self.log(f'Reserve Now: Could not reserve')
-                break
-
-            reserved_resources = random.sample(trm[t], resources)
-            # Remove those resources from the time resource map
-            for r in reserved_resources:
-                self.log(f'Reserve Now: Reserved {len(reserved_resources)} at {t}')
-                trm[t].remove(r)
-
-        return trm
-        
-    
     def resource_utilization(self):
 
-        busy = len(self.get_all_busy())
-        total = len(self.resources)
+        busy = self.num_busy()
+        total = self.num_resources
 
         utilization = busy/total
 
-        return utilization
\ No newline at end of file
+        return utilization
+
+    def checkpoint_state(self) -> dict:
+        """
+        Returns the resource state, free list, allocations, RNG and accounting.
+        """
+        return {k: v for k, v in vars(self).items() if k not in ('simulator', 'logger')}
+
+    def restore_state(self, state: dict):
+        vars(self).update(state)
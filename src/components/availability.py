@@ -0,0 +1,133 @@
+from bisect import bisect_left, bisect_right, insort
+from itertools import accumulate
+import numpy as np
+
+__metaclass__ = type
+
+
+class AvailabilityWindow:
+    """
+    Free resource counts from now until the last expected job end.
+
+    counts[i] is the number of resources expected to be free at times[i], times[0]
+    is the current time. Reservations only change the counts, resource ids are
+    never copied.
+    """
+
+    def __init__(self, times: list[int], counts: list[int]):
+        self.times = times
+        self.counts = counts
+
+    def __len__(self):
+        return len(self.times)
+
+    def __iter__(self):
+        return iter(self.times)
+
+    def items(self):
+        return zip(self.times, self.counts)
+
+    def earliest(self, resources) -> int:
+        """
+        Returns the index of the first time with at least resources free, -1 if there is none.
+        """
+        for i, c in enumerate(self.counts):
+            if c >= resources:
+                return i
+        return -1
+
+    def fits(self, resources, until) -> bool:
+        """
+        Checks if resources are free at every time up to until.
+        """
+        for t, c in zip(self.times, self.counts):
+            if t > until:
+                break
+            if c < resources:
+                return False
+        return True
+
+    def reserve(self, resources, start, end) -> None:
+        """
+        Removes resources from every time in [start, end].
+        """
+        counts = self.counts
+        for i in range(bisect_left(self.times, start), len(self.times)):
+            if self.times[i] > end:
+                break
+            counts[i] -= resources
+
+
+class AvailabilityProfile:
+    """
+    Step function of the resources released by running jobs, keyed by their expected end time.
+
+    The profile is updated when a job starts and when it ends, so building the
+    availability from now on only walks the distinct end times in the future.
+    """
+
+    def __init__(self, allocator):
+        self.allocator = allocator
+
+        # Sorted distinct expected end times
+        self._times: list[int] = []
+
+        # Expected end time -> resources released at that time
+        self._released: dict[int, int] = {}
+
+        # Expected end time -> ids of the jobs ending at that time
+        self._ending: dict[int, set[int]] = {}
+
+        # Job id -> (expected end time, resources)
+        self._jobs: dict[int, tuple[int, int]] = {}
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def add(self, job_id, end_time, resources) -> None:
+        """
+        Adds a running job expected to release resources at end_time.
+        """
+        if end_time not in self._released:
+            insort(self._times, end_time)
+            self._released[end_time] = 0
+            self._ending[end_time] = set()
+
+        self._released[end_time] += resources
+        self._ending[end_time].add(job_id)
+        self._jobs[job_id] = (end_time, resources)
+
+    def remove(self, job_id) -> None:
+        """
+        Removes a job that is no longer running.
+        """
+        end_time, resources = self._jobs.pop(job_id)
+
+        self._released[end_time] -= resources
+        self._ending[end_time].discard(job_id)
+
+        if not self._ending[end_time]:
+            del self._released[end_time]
+            del self._ending[end_time]
+            del self._times[bisect_right(self._times, end_time) - 1]
+
+    def window(self, now, available) -> AvailabilityWindow:
+        """
+        Returns the free resource counts at now and at every expected end time after now.
+
+        NOTE: Jobs expected to end at or before now are exceeding their walltime or
+        their end event has not been processed yet, so they are left out.
+        """
+        future = self._times[bisect_right(self._times, now):]
+        counts = list(accumulate((self._released[t] for t in future), initial=available))
+        return AvailabilityWindow([now] + future, counts)
+
+    def resource_ids(self, now, t) -> np.ndarray:
+        """
+        Returns the ids of the resources expected to be free at time t.
+        """
+        ids = [self.allocator.available_ids()]
+        for end_time in self._times[bisect_right(self._times, now):bisect_right(self._times, t)]:
+            for job_id in self._ending[end_time]:
+                ids.append(self.allocator.get_job_resources(job_id))
+        return np.concatenate(ids)
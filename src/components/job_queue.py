@@ -0,0 +1,88 @@
+__metaclass__ = type
+
+
+class JobQueue:
+    """
+    Order preserving queue of jobs with removal by job id.
+
+    Removed jobs leave a hole in the backing list that is skipped while
+    iterating (lazy deletion). The list is compacted once holes make up
+    more than half of it, so removal is O(1) amortized.
+    """
+
+    def __init__(self):
+        self._jobs: list = []
+
+        # Job id -> position in _jobs
+        self._pos: dict[int, int] = {}
+
+        # Position of the first job still in the queue
+        self._head = 0
+
+    def __len__(self):
+        return len(self._pos)
+
+    def __bool__(self):
+        return len(self._pos) > 0
+
+    def __contains__(self, job_id):
+        return job_id in self._pos
+
+    def __iter__(self):
+        jobs = self._jobs
+        for i in range(self._head, len(jobs)):
+            job = jobs[i]
+            if job is not None:
+                yield job
+
+    def append(self, job) -> None:
+        """
+        Adds a job to the tail of the queue.
+        """
+        if job.id in self._pos:
+            raise ValueError(f'Job {job.id} is already queued')
+        self._pos[job.id] = len(self._jobs)
+        self._jobs.append(job)
+
+    def head(self):
+        """
+        Returns the job at the head of the queue, None if the queue is empty.
+        """
+        if not self._pos:
+            return None
+        return self._jobs[self._head]
+
+    def get(self, job_id):
+        """
+        Returns a queued job given its id, None if it is not queued.
+        """
+        pos = self._pos.get(job_id)
+        if pos is None:
+            return None
+        return self._jobs[pos]
+
+    def remove(self, job) -> None:
+        """
+        Removes a job from the queue.
+        """
+        pos = self._pos.pop(job.id)
+        self._jobs[pos] = None
+
+        # Move the head past the holes
+        if pos == self._head:
+            jobs = self._jobs
+            head = self._head
+            while head < len(jobs) and jobs[head] is None:
+                head += 1
+            self._head = head
+
+        if len(self._jobs) > 2 * len(self._pos) + 32:
+            self._compact()
+
+    def _compact(self) -> None:
+        """
+        Rebuilds the backing list without the holes.
+        """
+        self._jobs = [job for job in self._jobs[self._head:] if job is not None]
+        self._pos = {job.id: i for i, job in enumerate(self._jobs)}
+        self._head = 0
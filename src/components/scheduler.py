@@ -1,81 +1,164 @@
 from dataclasses import dataclass
-from enum import Enum
+from enum import IntEnum
 import random
 
+import numpy as np
+
 from components.allocator import Allocator
-from asynclogger import AsyncLogger
+from components.availability import AvailabilityProfile, AvailabilityWindow
+from components.job_queue import JobQueue
+from itertools import islice
+import heapq
+from asynclogger import AsyncLogger, DEBUG, INFO
 import time
 import copy
 
 __metaclass__ = type
 
 
-class JobState(Enum):
+class JobState(IntEnum):
     WAITING = 1
     RUNNING = 2
     FINISHED = 3
 
 
-@dataclass
+@dataclass(slots=True)
 class Job:
 
     # These stay the same
     id: int
-    name: str
     resources: int
     walltime: int
     runtime: int
 
     # These may change
     state: JobState = JobState.WAITING
-    resource_ids: list[int] = None
+    # Shared with the allocator, do not modify
+    resource_ids: np.ndarray = None
 
     # Result fields
-    res_submit_ts = -1
-    res_run_ts = -1
-    res_end_ts = -1
+    res_submit_ts: int = -1
+    res_run_ts: int = -1
+    res_end_ts: int = -1
+
+    @property
+    def name(self) -> str:
+        return f'job.{self.id}'
+
+
+# Runtimes below this many seconds count as this long in the bounded slowdown
+BSLD_THRESHOLD = 10
+
+def bounded_slowdown(job: Job) -> float:
+    """
+    Returns max((wait + runtime)/max(runtime, BSLD_THRESHOLD), 1) of a finished job.
+    """
+    wait = job.res_run_ts - job.res_submit_ts
+    runtime = job.res_end_ts - job.res_run_ts
+    return max((wait + runtime)/max(runtime, BSLD_THRESHOLD), 1)
 
 
 class Scheduler:
 
-    def __init__(self, simulator, log_dir):
-        self.logger = AsyncLogger(f'{log_dir}/scheduler.log')
-        self.logger.write_log(f'Initialized Scheduler')
+    # Scheduling policies: FCFS with EASY backfilling, or plain FCFS
+    POLICIES = ('easy', 'fcfs')
+
+    def __init__(self, simulator, log_dir, policy='easy', append_log=False):
+        self.logger = AsyncLogger(f'{log_dir}/scheduler.log', name='scheduler', append=append_log)
+        if not append_log:
+            self.logger.write_log(f'Initialized Scheduler')
         
         self.simulator = simulator
         self.allocator: Allocator = self.simulator.allocator
-        self._queue: list[Job] = []
-        self._scheduled: list[int] = []
-        self._running: list[Job] = []
-        self._finished: list[Job] = []
+
+        self.set_policy(policy)
+        self._queue: JobQueue = JobQueue()
+        self._scheduled: dict[int, Job] = {}
+        self._running: dict[int, Job] = {}
+
+        # Job id -> job, for every job that is queued, scheduled or running
+        self._jobs: dict[int, Job] = {}
+
+        # Running aggregates, so metrics never walk the jobs
+        # Wait of every started job
+        self._wait_sum = 0
+        self._wait_count = 0
+        # Bounded slowdown of every finished job
+        self._bsld_sum = 0.0
+        self._bsld_count = 0
+        # Resources x walltime of the queued jobs
+        self._backlog = 0
+
+        # When batching, cycles that can not start any job are skipped, so the
+        # events of an instant are applied without a cycle until one could
+        # NOTE: A skipped cycle would not have allocated anything or drawn from
+        # the allocator RNG, so the decisions are the same as in per-event mode
+        self.batch: bool = False
+        self.cycles_skipped = 0
+
+        # Min-heap of (resources, job id) of the queued jobs when batching,
+        # entries of jobs that left the queue are dropped lazily
+        self._sizes: list[tuple[int, int]] = []
+
+        # Expected resource releases of the running jobs, used for backfilling
+        self._profile = AvailabilityProfile(self.allocator)
+
+        # Scheduling cycles run, with their total and longest wall-clock time in seconds
+        self.cycles = 0
+        self.cycle_time = 0.0
+        self.cycle_time_max = 0.0
+
+        # Times the phases of the cycle if set, see profiler.py
+        self.profiler = None
+
+        # Finished jobs are handed to it if set, see job_results.py, and dropped
+        self.job_recorder = None
 
         pass
 
-    def log(self, s):
-        self.logger.write_log(f'{self.simulator.now()} {s}')
+    def set_policy(self, policy):
+        """
+        Sets the policy of the next scheduling cycles.
+        """
+        if policy not in self.POLICIES:
+            raise ValueError(f'Unknown policy {policy}, expected one of {self.POLICIES}')
+        self.policy = policy
+
+    def log(self, fmt, *args, level=INFO):
+        self.logger.log_at(self.simulator.now(), fmt, *args, level=level)
+
+    def debug(self, fmt, *args):
+        if self.logger.debug_enabled:
+            self.logger.log_at(self.simulator.now(), fmt, *args, level=DEBUG)
+
+    def get_job(self, job_id) -> Job | None:
+        """
+        Returns a queued, scheduled or running job given its id.
+        """
+        return self._jobs.get(job_id)
     
     def queue(self, job: Job):
         """
         Queues a job
         """
-        self.log(f'Queue: {job.id} with resource requirement of {job.resources} for time {job.walltime}')
+        self.log('Queue: %s with resource requirement of %s for time %s', job.id, job.resources, job.walltime)
 
         job.res_submit_ts = self.simulator.now()
 
         # Add the job to the queue
         self._queue.append(job)
+        self._jobs[job.id] = job
+        if self.batch:
+            heapq.heappush(self._sizes, (job.resources, job.id))
+        self._backlog += job.resources * job.walltime
 
         # Run a scheduling cycle
-        self._schedule()
+        self._request_cycle()
 
     
     def start(self, job_id):
-        # Look for the job in queued jobs
-        job: Job = None
-        for j in self._scheduled:
-            if j.id == job_id:
-                job = j
-                break
+        # Look for the job in scheduled jobs
+        job: Job = self._scheduled.pop(job_id, None)
         if job == None:
             print('Start Error: Job not found in queue')
             raise LookupError
@@ -86,23 +169,19 @@ class Scheduler:
         if job.resource_ids is None:
             print('Resource ids were none')
 
-        # Remove from scheduled
-        self._scheduled.remove(job)
-
-        # Add to list of running jobs
-        self._running.append(job)
+        # Add to running jobs
+        self._running[job.id] = job
+        self._wait_sum += job.res_run_ts - job.res_submit_ts
+        self._wait_count += 1
+        self._profile.add(job.id, job.res_run_ts + job.walltime, job.resources)
 
-        self.log(f'Start: {job.id} with resource requirement of {job.resources} for time {job.walltime}')
+        self.log('Start: %s with resource requirement of %s for time %s', job.id, job.resources, job.walltime)
 
 
     def end(self, job_id):
 
         # Look for the job in running jobs
-        job = None
-        for j in self._running:
-            if j.id == job_id:
-                job = j
-                break
+        job = self._running.pop(job_id, None)
         if job == None:
             print('End Error: Job not found in running job')
             raise LookupError
@@ -114,18 +193,76 @@ class Scheduler:
         # Deallocate the resources for the job
         self.allocator.deallocate(job.id)
 
-        # Remove from list of running jobs
-        self._running.remove(job)
+        # Remove from running jobs
+        self._profile.remove(job.id)
+        del self._jobs[job.id]
+        bsld = bounded_slowdown(job)
+        self._bsld_sum += bsld
+        self._bsld_count += 1
 
-        # Add to list of finished jobs
-        self._finished.append(job)
+        # Only the aggregates keep the finished job
+        if self.job_recorder is not None:
+            self.job_recorder.record(job, bsld)
 
-        self.log(f'End: {job.id} with resource requirement of {job.resources} for time {job.walltime}')
+        self.log('End: %s with resource requirement of %s for time %s', job.id, job.resources, job.walltime)
 
         # Run a scheduling cycle
-        self._schedule()
+        self._request_cycle()
 
+    def warm_start(self, running: list[tuple[Job, int, int]], queued: list[tuple[Job, int]]) -> list[Job]:
+        """
+        Puts in place jobs that were already running or queued. running holds
+        (job, submit, start) and queued (job, submit), both in submit order.
+        Returns the running jobs, the ones that do not fit on the free resources
+        are queued instead.
+        """
+        started: list[Job] = []
+        waiting: list[tuple[Job, int]] = []
+        for job, submit, start in running:
+            resource_ids = self.allocator.allocate(job.id, job.resources)
+            if resource_ids is None:
+                waiting.append((job, submit))
+                continue
 
+            job.resource_ids = resource_ids
+            job.res_submit_ts = submit
+            job.res_run_ts = start
+            job.state = JobState.RUNNING
+            self._running[job.id] = job
+            self._jobs[job.id] = job
+            self._profile.add(job.id, start + job.walltime, job.resources)
+            started.append(job)
+
+        for job, submit in sorted(waiting + list(queued), key=lambda item: item[1]):
+            job.res_submit_ts = submit
+            self._queue.append(job)
+            self._jobs[job.id] = job
+            if self.batch:
+                heapq.heappush(self._sizes, (job.resources, job.id))
+            self._backlog += job.resources * job.walltime
+
+        self.log('Warm start: %s running, %s queued', len(started), len(waiting) + len(queued))
+        self._request_cycle()
+        return started
+
+    def _request_cycle(self):
+        """
+        Runs a scheduling cycle, unless batching and it could not start any job.
+        """
+        if self.batch and not self._can_start_any():
+            self.cycles_skipped += 1
+        else:
+            self._schedule()
+
+    def _can_start_any(self) -> bool:
+        """
+        Returns whether some queued job fits the free resources.
+        """
+        sizes = self._sizes
+        queue = self._queue
+        while sizes and sizes[0][1] not in queue:
+            heapq.heappop(sizes)
+        return len(sizes) > 0 and sizes[0][0] <= self.allocator.num_available()
 
     def _schedule(self):
         """
@@ -135,191 +272,201 @@ class Scheduler:
         # TODO: Build a new queue evertime
         # This would get rid of _pending_run list
 
-        t = time.time()
-        self.log(f'Entered scheduling cycle...')
+        t = time.perf_counter()
+        debug = self.logger.debug_enabled
+        self.debug('Entered scheduling cycle...')
         # Try and schedule jobs in the head of the queue
         can_schedule: list[Job] = []
         for job in self._queue:
 
-            self.log(f'Considering job {job.id} with resources {job.resources} for {job.walltime}.')
+            if debug:
+                self.debug('Considering job %s with resources %s for %s.', job.id, job.resources, job.walltime)
 
             # Try allocating resources
             resource_ids = self.allocator.allocate(job.id, job.resources)
 
             # If no resources stop
             # Ensures strict ordering
-            if not resource_ids:
-                self.log(f'Can not schedule')
+            if resource_ids is None:
+                self.debug('Can not schedule')
                 break
 
-            self.log(f'Can schedule')
+            if debug:
+                self.debug('Can schedule')
             job.resource_ids = resource_ids
             can_schedule.append(job)
+        t_head = time.perf_counter()
         
         # Schedule run events
         for job in can_schedule:
 
             # Remove from job from queued jobs
-            self._queue.remove(job)
+            self._dequeue(job)
 
             # Schedule the run event
             job.res_run_ts = self.simulator.create_run_event(job.id)
-            self._scheduled.append(job)
+            self._scheduled[job.id] = job
+        t_run = time.perf_counter()
 
 
         # Attempt to backfill if jobs are still in queue
         # NOTE: We backfill around the top 1 job, so the queue must have 2 jobs
-        if len(self._queue) > 0:
+        if self.policy == 'easy' and len(self._queue) > 0:
             self._backfill_easy()
-
-        self.log(f'Leaving scheduling cycle...')
-        t_cycle = time.time() - t
-        self.log(f'Cycle took {t_cycle} seconds.')
+            if self.profiler is not None:
+                self.profiler.add('cycle;backfill', time.perf_counter() - t_run)
+
+        self.debug('Leaving scheduling cycle...')
+        t_end = time.perf_counter()
+        t_cycle = t_end - t
+        self.cycles += 1
+        self.cycle_time += t_cycle
+        if t_cycle > self.cycle_time_max:
+            self.cycle_time_max = t_cycle
+        self.debug('Cycle took %s seconds.', t_cycle)
+
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.add('cycle', t_cycle)
+            profiler.add('cycle;head_allocation', t_head - t)
+            profiler.add('cycle;run_events', t_run - t_head)
         pass
 
-    def _build_time_resource_map(self):
-        # print('Building time resrouce map:')
-
-        # Sort the jobs by their end times
-        running_jobs = sorted(self._running, key=lambda x: x.res_run_ts + x.walltime)
-        for j in running_jobs:
-            self.log(f'Build TRM: Running jobs: {j}')
-
-        trm = {}
-        cumulative = [resource.id for resource in self.allocator.get_available()]
-        trm[self.simulator.now()] = cumulative[:]
-        # print(f'\t\tNow {self.simulator.now()}, {trm[self.simulator.now()]}')
-        self.log(f'Buil TRM: At {self.simulator.now()} Available {len(cumulative[:])}.')
-        for j in running_jobs:
-            end_time = j.res_run_ts + j.walltime
-            resource_ids = j.resource_ids
-
-
-            # NOTE: If any running jobs are exceeding their walltime, the scheduler does not know
-            # when it ends, exclude it from the map
-            if end_time < self.simulator.now():
-                self.log(f'Build TRM: Job {j.id} was supposed to end at {end_time}. It is exceeding walltime!')
-                continue
-
-            # NOTE: If a job is ending now, and its end event hasnt occured, it must 
-            # removed from the running jobs list to build the time resource map
-            if end_time == self.simulator.now():
-                self.log(f'Build TRM: Job {j.id} ends at {end_time}. End event has not been processed!')
-                continue
-
-            # print(f'\t\tJob: {j.id}, {end_time}, {resource_ids}')
-
-            cumulative += resource_ids[:]
-
-            if end_time in trm:
-                trm[end_time] += resource_ids[:]
-            else:
-                trm[end_time] = cumulative[:]
-            
-            self.log(f'Build TRM: Job {j.id} ends at {end_time}. Available {len(trm[end_time])}.')
-
-        return dict(sorted(trm.items()))
+    def _build_availability_window(self) -> AvailabilityWindow:
+        """
+        Returns the resources expected to be free from now on, given the running jobs.
+        """
+        window = self._profile.window(self.simulator.now(), self.allocator.num_available())
+        self.debug('Build TRM: At %s Available %s, %s future end times.', self.simulator.now(), window.counts[0], len(window) - 1)
+        return window
 
     def _backfill_easy(self):
         """
         Tries to backfill jobs without delaying the 1st job in the queue.
         """
-        self.log(f'Entered backfill..')
+        debug = self.logger.debug_enabled
+        profiler = self.profiler
+        t = time.perf_counter()
+        self.debug('Entered backfill..')
         
         # Get the top job
-        top_job = self._queue[0]
+        top_job = self._queue.head()
         
-        self.log(f'Top Job: {top_job.id} with resource requirement of {top_job.resources} for time {top_job.walltime}')
+        self.debug('Top Job: %s with resource requirement of %s for time %s', top_job.id, top_job.resources, top_job.walltime)
 
-        trm = self._build_time_resource_map()
+        trm = self._build_availability_window()
+        t_trm = time.perf_counter()
 
 
         # Now given this map reserve resources for the top job
         trm = self.allocator.reserve_future(trm, top_job.id, top_job.resources, top_job.walltime)
+        t_reserve = time.perf_counter()
+        if profiler is not None:
+            profiler.add('cycle;backfill;trm_build', t_trm - t)
+            profiler.add('cycle;backfill;reserve_future', t_reserve - t_trm)
 
         if trm is None:
-            self.log(f'Skipped backfilling because TRM was None')
+            self.debug('Skipped backfilling because TRM was None')
             return
         
 
         # Check if any job in the queue can be allocated using these resources now
         backfill_jobs: list[Job] = []
-        for j in self._queue[1:]:
-            self.log(f'Backfill Job: {j.id} with resource requirement of {top_job.resources} for time {top_job.walltime}')
+        for j in islice(self._queue, 1, None):
+            if debug:
+                self.debug('Backfill Job: %s with resource requirement of %s for time %s', j.id, j.resources, j.walltime)
             # # If a job has a pending run event, dont consider it for backfill
             # if j.id in self._pending_run:
             #     continue
 
-            can_backfill = True
-
-            # This loop checks if the job can be backfilled
-            # If not it sets can_backfill to False
-            for t in trm:
-                resources = trm[t]
-                self.log(f'Backfill Job: Resources Available {len(resources)}; Resources Required {j.resources}')
-
-                # Dont check beyond the walltime of the job
-                if t > self.simulator.now() + j.walltime:
-                    break
-
-                # Not enough resources
-                if len(resources) < j.resources:
-                    can_backfill = False
-                    self.log(f'Backfill Job: {j.id}; Cannot backfill')
-                    break
+            # Check that enough resources stay free until the walltime of the job
+            can_backfill = trm.fits(j.resources, self.simulator.now() + j.walltime)
+            if not can_backfill and debug:
+                self.debug('Backfill Job: %s; Cannot backfill', j.id)
             
             if can_backfill:
                 # Add to jobs that can be backfilled
-                self.log(f'Backfill Job: {j.id}; Backfill Eligible, reserving resources.')
+                self.debug('Backfill Job: %s; Backfill Eligible, reserving resources.', j.id)
                 backfill_jobs.append(j)
 
                 # Update the time resource map
                 trm = self.allocator.reserve_now(trm, j.id, j.resources, j.walltime)
+        t_scan = time.perf_counter()
 
         # print('\tEligible:')
         # print(f'\t\t{[j.id for j in backfill_jobs]}')
 
         # print('Backfill:', [j.id for j in backfill_jobs])
         for job in backfill_jobs:
-            self.log(f'Backfill Job Allocate: {j.id} with resource requirement of {top_job.resources} for time {top_job.walltime}')
+            self.debug('Backfill Job Allocate: %s with resource requirement of %s for time %s', job.id, job.resources, job.walltime)
             # Try allocating resources
             resources = self.allocator.allocate(job.id, job.resources)
 
             # If no resources stop
             # Ensures strict ordering
-            if not resources:
+            if resources is None:
                 print('Backfill Error: Job eligible but no resources!')
                 raise LookupError
             
             # Remove from job from queued jobs
-            self._queue.remove(job)
+            self._dequeue(job)
 
             # Give the job its resources
             job.resource_ids = resources
 
             # Schedule the run event
             job.res_run_ts = self.simulator.create_run_event(job.id)
-            self._scheduled.append(job)
+            self._scheduled[job.id] = job
 
+        if profiler is not None:
+            profiler.add('cycle;backfill;scan', t_scan - t_reserve)
+            profiler.add('cycle;backfill;run_events', time.perf_counter() - t_scan)
 
-    def average_wait_time(self):
 
-        total_wait = 0
-        job_count = 0
-        for job in self._finished:
-            wait = job.res_run_ts - job.res_submit_ts
-            total_wait += wait
-            job_count += 1
+    def _dequeue(self, job: Job):
+        self._queue.remove(job)
+        self._backlog -= job.resources * job.walltime
 
-        for job in self._running:
-            wait = job.res_run_ts - job.res_submit_ts
-            total_wait += wait
-            job_count += 1
+    def average_wait_time(self):
+        """
+        Returns the average wait of the running and finished jobs.
+        """
+        if self._wait_count == 0:
+            return 0
 
-        if job_count == 0:
+        return self._wait_sum/self._wait_count
+
+    def average_bounded_slowdown(self):
+        """
+        Returns the average bounded slowdown of the finished jobs.
+        """
+        if self._bsld_count == 0:
             return 0
-        
 
-        avg_wait = total_wait/job_count
+        return self._bsld_sum/self._bsld_count
 
-        return avg_wait
+    def queue_length(self) -> int:
+        return len(self._queue)
+
+    def running_count(self) -> int:
+        return len(self._running)
+
+    def backlog_node_hours(self):
+        """
+        Returns the resources x walltime requested by the queued jobs, in node hours.
+        """
+        return self._backlog/3600
+
+    def checkpoint_state(self) -> dict:
+        """
+        Returns the queues, jobs, aggregates and availability profile.
+        """
+        # NOTE: One dict so jobs shared by the queues and the registry stay shared
+        state = {k: v for k, v in vars(self).items() if k not in ('simulator', 'allocator', 'logger', 'profiler', 'job_recorder', '_profile')}
+        state['_profile'] = {k: v for k, v in vars(self._profile).items() if k != 'allocator'}
+        return state
+
+    def restore_state(self, state: dict):
+        state = dict(state)
+        vars(self._profile).update(state.pop('_profile'))
+        vars(self).update(state)
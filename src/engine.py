@@ -0,0 +1,233 @@
+"""
+Engine
+
+Event engines that drive the Simulator.
+
+An event is an integer code plus one argument. The simulator registers one
+handler per code and the engine calls handler(arg) at the event time. Events
+at the same time run by priority (lower first), then in scheduling order.
+
+HeapEngine is a plain heapq loop over tuple entries, SimulusEngine runs the
+same events in the same order on top of simulus.
+"""
+import heapq
+from itertools import count
+from typing import Callable
+
+__metaclass__ = type
+
+INFINITE_TIME = float('inf')
+
+
+class Engine:
+
+    def __init__(self, handlers: dict[int, Callable], init_time=0):
+        self.handlers = handlers
+        self.events_processed = 0
+
+    @property
+    def now(self):
+        raise NotImplementedError
+
+    def sched(self, code, arg, until, prio=0):
+        """
+        Schedules the event code with arg at time until.
+        """
+        raise NotImplementedError
+
+    def peek(self):
+        """
+        Returns the time of the next event, infinity if there are none.
+        """
+        raise NotImplementedError
+
+    def peek_code(self):
+        """
+        Returns the code of the next event, None if there are none.
+        """
+        raise NotImplementedError(f'{type(self).__name__} can not peek at event codes')
+
+    def step(self):
+        """
+        Processes the next event.
+        """
+        raise NotImplementedError
+
+    def run(self, until=None, advance=True):
+        """
+        Processes events until there are none left, or only ones at or after until.
+        The clock then moves to until, unless advance is False.
+        """
+        raise NotImplementedError
+
+    def checkpoint_state(self) -> dict:
+        """
+        Returns the clock and the pending events.
+        """
+        raise NotImplementedError(f'{type(self).__name__} can not be checkpointed')
+
+    def restore_state(self, state: dict):
+        raise NotImplementedError(f'{type(self).__name__} can not be checkpointed')
+
+    def __len__(self):
+        """
+        Returns the number of pending events.
+        """
+        raise NotImplementedError
+
+
+class HeapEngine(Engine):
+
+    def __init__(self, handlers: dict[int, Callable], init_time=0):
+        super().__init__(handlers, init_time)
+
+        # Handlers indexed by event code
+        self._handlers: list[Callable] = [None] * (max(handlers) + 1)
+        for code, handler in handlers.items():
+            self._handlers[code] = handler
+
+        # Entries are (time, prio, seq, code, arg)
+        self._heap: list[tuple] = []
+        self._seq = count()
+        self._now = init_time
+
+    @property
+    def now(self):
+        return self._now
+
+    def __len__(self):
+        return len(self._heap)
+
+    def sched(self, code, arg, until, prio=0):
+        if until < self._now:
+            raise ValueError(f'Event at {until} is earlier than now ({self._now})')
+        heapq.heappush(self._heap, (until, prio, next(self._seq), code, arg))
+
+    def peek(self):
+        if self._heap:
+            return self._heap[0][0]
+        return INFINITE_TIME
+
+    def peek_code(self):
+        if self._heap:
+            return self._heap[0][3]
+        return None
+
+    def step(self):
+        if self._heap:
+            t, _, _, code, arg = heapq.heappop(self._heap)
+            self._now = t
+            self.events_processed += 1
+            self._handlers[code](arg)
+
+    def run(self, until=None, advance=True):
+        heap = self._heap
+        handlers = self._handlers
+        heappop = heapq.heappop
+        upper = INFINITE_TIME if until is None else until
+
+        processed = 0
+        try:
+            while heap and heap[0][0] < upper:
+                t, _, _, code, arg = heappop(heap)
+                self._now = t
+                processed += 1
+                handlers[code](arg)
+        finally:
+            self.events_processed += processed
+
+        if until is not None and advance:
+            self._now = until
+
+    def checkpoint_state(self) -> dict:
+        # Read the next sequence number without using it up
+        seq = next(self._seq)
+        self._seq = count(seq)
+        return {
+            'now': self._now,
+            'heap': list(self._heap),
+            'seq': seq,
+            'events_processed': self.events_processed,
+        }
+
+    def restore_state(self, state: dict):
+        self._now = state['now']
+        self._heap = list(state['heap'])
+        self._seq = count(state['seq'])
+        self.events_processed = state['events_processed']
+
+
+class SimulusEngine(Engine):
+
+    def __init__(self, handlers: dict[int, Callable], init_time=0):
+        super().__init__(handlers, init_time)
+
+        import simulus
+        self.sim = simulus.simulator(name='schedulus', init_time=init_time)
+
+        # simulus runs same time events in no particular order, so it only gets one
+        # event per pending time, and the events of that time wait in a heap of
+        # (prio, seq, code, arg) entries, giving the same order as HeapEngine
+        self._buckets: dict[float, list[tuple]] = {}
+        self._seq = count()
+        self._pending = 0
+
+    @property
+    def now(self):
+        return self.sim.now
+
+    def __len__(self):
+        return self._pending
+
+    def _dispatch(self, t):
+        bucket = self._buckets[t]
+        _, _, code, arg = heapq.heappop(bucket)
+        if bucket:
+            self.sim.sched(self._dispatch, t, until=t)
+        else:
+            del self._buckets[t]
+        self._pending -= 1
+        self.events_processed += 1
+        self.handlers[code](arg)
+
+    def sched(self, code, arg, until, prio=0):
+        if until < self.sim.now:
+            raise ValueError(f'Event at {until} is earlier than now ({self.sim.now})')
+        bucket = self._buckets.get(until)
+        if bucket is None:
+            bucket = self._buckets[until] = []
+            self.sim.sched(self._dispatch, until, until=until)
+        heapq.heappush(bucket, (prio, next(self._seq), code, arg))
+        self._pending += 1
+
+    def peek(self):
+        return self.sim.peek()
+
+    def peek_code(self):
+        if self._pending == 0:
+            return None
+        return self._buckets[self.sim.peek()][0][2]
+
+    def step(self):
+        self.sim.step()
+
+    def run(self, until=None, advance=True):
+        if until is None or advance:
+            self.sim.run(until=until)
+            return
+        while self.sim.peek() < until:
+            self.sim.step()
+
+
+ENGINES = {
+    'heap': HeapEngine,
+    'simulus': SimulusEngine,
+}
+
+def make_engine(name, handlers: dict[int, Callable], init_time=0) -> Engine:
+    """
+    Creates an engine given its name.
+    """
+    if name not in ENGINES:
+        raise ValueError(f'Unknown engine {name}, expected one of {list(ENGINES)}')
+    return ENGINES[name](handlers, init_time)
@@ -0,0 +1,93 @@
+"""
+Equivalence
+
+Checks that two configurations of the simulator make the same scheduling decisions.
+
+Runs a trace under both configurations of a check and compares the submit,
+start and end records (Q, R and E) of their events.log line by line. The
+allocator placement is seeded, and resource ids are not compared anyway.
+
+Run from src/:
+    python equivalence.py --trace ../data/pbs/input/job_log.swf --system ../data/pbs/input/system.json \
+        --check engines --out ../data/equivalence
+"""
+import argparse
+import os
+import sys
+
+from sweep import RunConfig, run_one
+
+__metaclass__ = type
+
+# Check name -> the Simulator options of the two runs compared
+CHECKS = {
+    # The simulus backend runs the same events in the same order as the heap engine
+    'engines': ({'engine': 'heap'}, {'engine': 'simulus'}),
+
+    # Batching only skips the cycles that could not start a job
+    'batch': ({'batch_events': False}, {'batch_events': True}),
+}
+
+# Event characters compared, allocator records carry resource ids that depend on placement
+DECISIONS = ('Q', 'R', 'E')
+
+
+def decisions(output_dir) -> list[str]:
+    """
+    Returns the Q, R and E lines of the events.log in output_dir, in order.
+    """
+    lines = []
+    with open(os.path.join(output_dir, 'events.log'), 'r') as f:
+        for line in f:
+            fields = line.rstrip('\n').split(',')
+            if len(fields) >= 3 and fields[1] in DECISIONS:
+                lines.append(line.rstrip('\n'))
+    return lines
+
+def compare(trace, system, out_root, check, seed=0) -> str | None:
+    """
+    Runs both configurations of check on the trace, returns None if their
+    decisions match, otherwise a description of the first difference.
+    """
+    if check not in CHECKS:
+        raise ValueError(f'Unknown check {check}, expected one of {list(CHECKS)}')
+
+    runs = []
+    for i, options in enumerate(CHECKS[check]):
+        config = RunConfig(trace, system, os.path.join(out_root, f'{check}_{i}'), seed=seed, options=dict(options))
+        result = run_one(config)
+        if result['error'] is not None:
+            raise RuntimeError(f'Run with {options} failed:\n{result["error"]}')
+        runs.append((options, decisions(config.output_dir)))
+
+    (options_a, a), (options_b, b) = runs
+    for i, (line_a, line_b) in enumerate(zip(a, b)):
+        if line_a != line_b:
+            return f'Record {i} differs: {line_a} with {options_a}, {line_b} with {options_b}'
+    if len(a) != len(b):
+        return f'{len(a)} records with {options_a}, {len(b)} with {options_b}'
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that two simulator configurations make the same scheduling decisions.')
+    parser.add_argument('--trace', required=True, help='Job log (swf)')
+    parser.add_argument('--system', default=None, help='System config, defaults to the swf header')
+    parser.add_argument('--check', nargs='+', default=list(CHECKS), choices=list(CHECKS))
+    parser.add_argument('--seed', type=int, default=0, help='Allocator seed')
+    parser.add_argument('--out', required=True, help='Root output directory, one sub directory per run')
+    args = parser.parse_args()
+
+    failed = 0
+    for check in args.check:
+        difference = compare(args.trace, args.system, args.out, check, args.seed)
+        if difference is None:
+            print(f'{check}: same decisions')
+        else:
+            print(f'{check}: {difference}')
+            failed += 1
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
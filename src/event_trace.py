@@ -0,0 +1,202 @@
+"""
+EventTrace
+
+Columnar binary record of the simulation events.
+
+EventRecorder appends events into preallocated NumPy arrays and writes them
+out a chunk at a time as one raw binary file per column, plus a meta.json
+describing the columns. EventTrace memory-maps those files back, so large
+traces load without parsing any text.
+
+ColumnWriter and read_columns implement that layout for any set of columns,
+job_results uses them for the finished jobs.
+"""
+import json
+import os
+import numpy as np
+import pandas as pd
+
+__metaclass__ = type
+
+# Column name -> dtype
+EVENT_COLUMNS = {
+    'time': np.int64,
+
+    # Event code
+    'code': np.int8,
+
+    # Job id, or resource id for per resource allocator events
+    'id': np.int64,
+
+    # Resources involved in allocator events, 0 otherwise
+    'count': np.int32,
+}
+
+META_FILE = 'meta.json'
+
+
+class ColumnWriter:
+    """
+    Appends rows into preallocated NumPy arrays, written out a chunk at a time
+    as one raw binary file per column plus a meta.json.
+    """
+
+    def __init__(self, path, columns: dict[str, type], chunk_size=1 << 16, count=0):
+        """
+        Writes into the directory path. With count, the first count rows already
+        in path are kept and new rows are appended after them.
+        """
+        self.path = path
+        self.columns = columns
+        self.chunk_size = chunk_size
+        self.count = count
+
+        os.makedirs(self.path, exist_ok=True)
+
+        self._arrays = {c: np.empty(chunk_size, dtype=dtype) for c, dtype in columns.items()}
+        self._n = 0
+
+        if count > 0:
+            # Drop anything written after the first count rows
+            for c, dtype in columns.items():
+                os.truncate(self._column_path(c), count * np.dtype(dtype).itemsize)
+        self._files = {c: open(self._column_path(c), 'ab' if count > 0 else 'wb') for c in columns}
+
+    def _column_path(self, column):
+        return os.path.join(self.path, f'{column}.bin')
+
+    def flush(self):
+        """
+        Writes the buffered rows to the column files.
+        """
+        if self._n == 0:
+            return
+        for c, f in self._files.items():
+            f.write(self._arrays[c][:self._n].tobytes())
+            f.flush()
+        self.count += self._n
+        self._n = 0
+        self._write_meta()
+
+    def meta(self) -> dict:
+        """
+        Returns the contents of meta.json.
+        """
+        return {
+            'count': self.count,
+            'columns': {c: np.dtype(dtype).str for c, dtype in self.columns.items()},
+        }
+
+    def _write_meta(self):
+        with open(os.path.join(self.path, META_FILE), 'w') as f:
+            json.dump(self.meta(), f)
+
+    def close(self):
+        """
+        Flushes the remaining rows and closes the column files.
+        """
+        self.flush()
+        self._write_meta()
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+def read_columns(path) -> tuple[dict, dict[str, np.ndarray]]:
+    """
+    Returns the meta.json of a directory written by a ColumnWriter, and its columns memory-mapped.
+    """
+    with open(os.path.join(path, META_FILE), 'r') as f:
+        meta = json.load(f)
+
+    n = meta['count']
+    columns = {}
+    for c, dtype in meta['columns'].items():
+        if n == 0:
+            columns[c] = np.empty(0, dtype=dtype)
+        else:
+            columns[c] = np.memmap(os.path.join(path, f'{c}.bin'), dtype=dtype, mode='r', shape=(n,))
+    return meta, columns
+
+
+class EventRecorder(ColumnWriter):
+
+    def __init__(self, path, codes: dict[int, str], chunk_size=1 << 16, count=0):
+        """
+        Records events into the directory path. codes maps event codes to the
+        characters used when exporting to CSV. With count, the first count
+        events already in path are kept and new events are appended after them.
+        """
+        super().__init__(path, EVENT_COLUMNS, chunk_size, count)
+        self.codes = codes
+
+        self._time = self._arrays['time']
+        self._code = self._arrays['code']
+        self._id = self._arrays['id']
+        self._count = self._arrays['count']
+
+    def record(self, time, code, id, count=0):
+        """
+        Appends one event.
+        """
+        n = self._n
+        self._time[n] = time
+        self._code[n] = code
+        self._id[n] = id
+        self._count[n] = count
+        self._n = n + 1
+        if self._n == self.chunk_size:
+            self.flush()
+
+    def meta(self) -> dict:
+        meta = super().meta()
+        meta['codes'] = {str(k): v for k, v in self.codes.items()}
+        return meta
+
+
+class EventTrace:
+    """
+    Memory-mapped reader of a directory written by EventRecorder.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        meta, columns = read_columns(path)
+
+        self.codes: dict[int, str] = {int(k): v for k, v in meta['codes'].items()}
+        self.columns = list(columns)
+        for c, array in columns.items():
+            setattr(self, c, array)
+
+    def __len__(self):
+        return len(self.time)
+
+    def chars(self) -> np.ndarray:
+        """
+        Returns the event characters (Q, R, E, ...) of every event.
+        """
+        lookup = np.full(max(self.codes, default=0) + 1, 'X', dtype=object)
+        for code, char in self.codes.items():
+            lookup[code] = char
+        return lookup[self.code]
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Returns the events with the columns of events.log (time, event, id).
+        """
+        return pd.DataFrame({
+            'time': np.asarray(self.time),
+            'event': self.chars(),
+            'id': np.asarray(self.id),
+        })
+
+    def to_csv(self, path):
+        """
+        Exports the events as time,CHAR,id lines.
+        """
+        self.to_dataframe().to_csv(path, header=False, index=False)
+
+def read_event_trace(path) -> EventTrace:
+    """
+    Reads an event trace written by EventRecorder.
+    """
+    return EventTrace(path)
@@ -1,4 +1,7 @@
+import hashlib
 import json
+import os
+import numpy as np
 import pandas as pd
 from dataclasses import dataclass
 
@@ -57,7 +60,10 @@ event_data_columns = [
     "location"
 ]
 
-def read_job_data(path, CSV = False) -> pd.DataFrame:
+# Parsed SWF traces are cached here, override with the SCHEDULUS_CACHE_DIR environment variable
+SWF_CACHE_DIR = os.environ.get('SCHEDULUS_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'schedulus'))
+
+def read_job_data(path, CSV = False, cache = True) -> pd.DataFrame:
     """
     Reads job data
     """
@@ -65,20 +71,84 @@ def read_job_data(path, CSV = False) -> pd.DataFrame:
     if CSV:
         return pd.read_csv(path, names=swf_columns).sort_values(by=DfFileds.Job.ID)
     
-    data = []
-    with open(f'{path}', 'r') as file:
-        for line in file:
-        
-            # TODO: For now ignoring the header of the swf file
-            if line[0] == ';':
-                continue
-
-            # Split the line into elements, convert non-empty elements to integers
-            row = [int(x) for x in line.split() if x]
-            data.append(row)
-    df = pd.DataFrame(data, columns=swf_columns)
+    df, _ = read_swf(path, cache=cache)
     return df
 
+def read_swf_header(path) -> dict[str, str]:
+    """
+    Reads the "; Key: Value" lines at the top of an swf file.
+    """
+    header = {}
+    with open(path, 'r') as file:
+        for line in file:
+            if line[0] != ';':
+                break
+            key, sep, value = line[1:].partition(':')
+            if sep:
+                header[key.strip()] = value.strip()
+    return header
+
+def read_swf(path, cache = True) -> tuple[pd.DataFrame, dict[str, str]]:
+    """
+    Reads an swf file into int64 columns, along with its header.
+
+    The parsed columns are cached as .npz files keyed by the file path, size
+    and modification time, so reading the same trace again skips parsing.
+    """
+    cache_path = _swf_cache_path(path) if cache else None
+
+    if cache_path is not None and os.path.exists(cache_path):
+        with np.load(cache_path) as data:
+            df = pd.DataFrame({c: data[c] for c in swf_columns})
+            header = json.loads(str(data['header']))
+        return df, header
+
+    header = read_swf_header(path)
+    df = pd.read_csv(
+        path,
+        sep=r'\s+',
+        comment=';',
+        header=None,
+        names=swf_columns,
+        usecols=range(len(swf_columns)),
+        dtype=np.int64,
+        engine='c'
+    )
+
+    if cache_path is not None:
+        _write_swf_cache(cache_path, df, header)
+
+    return df, header
+
+def _swf_cache_path(path) -> str:
+    st = os.stat(path)
+    key = f'{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}'
+    return os.path.join(SWF_CACHE_DIR, hashlib.sha1(key.encode()).hexdigest() + '.npz')
+
+def _write_swf_cache(cache_path, df: pd.DataFrame, header: dict[str, str]) -> None:
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+
+        # Write to a temporary file first so readers never see a partial cache
+        tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, header=json.dumps(header), **{c: df[c].to_numpy() for c in swf_columns})
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        # The cache is only an optimization
+        pass
+
+def read_system_config_swf(header: dict[str, str]) -> SystemConfig:
+    """
+    Reads the system config from the MaxNodes/MaxProcs fields of an swf header
+    """
+    if 'MaxNodes' not in header and 'MaxProcs' not in header:
+        raise ValueError('SWF header has neither MaxNodes nor MaxProcs')
+
+    nodes = int(header.get('MaxNodes', header.get('MaxProcs')))
+    procs = int(header.get('MaxProcs', nodes))
+    return SystemConfig(nodes=nodes, ppn=max(procs // nodes, 1))
+
 def read_event_data(path, start_zero = False) -> pd.DataFrame:
     """
     Reads event data
@@ -0,0 +1,104 @@
+"""
+JobResults
+
+Columnar binary record of the finished jobs.
+
+The scheduler hands every finished job to a JobRecorder, which buffers one
+chunk of rows and writes the columns out with the layout of event_trace, so
+memory stays flat however many jobs finish. read_job_results() memory-maps
+the columns back for analysis.
+
+    results = read_job_results('../data/pbs/output/jobs')
+    df = results.to_dataframe()
+"""
+import numpy as np
+import pandas as pd
+
+from event_trace import ColumnWriter, read_columns
+
+__metaclass__ = type
+
+# Column name -> dtype
+JOB_COLUMNS = {
+    'id': np.int64,
+    'submit': np.int64,
+    'start': np.int64,
+    'end': np.int64,
+    'nodes': np.int32,
+
+    # Requested walltime, and the time the job actually ran
+    'walltime': np.int64,
+    'runtime': np.int64,
+
+    'wait': np.int64,
+
+    # Bounded slowdown, see scheduler.bounded_slowdown
+    'slowdown': np.float64,
+}
+
+
+class JobRecorder(ColumnWriter):
+
+    def __init__(self, path, chunk_size=1 << 14, count=0):
+        """
+        Records finished jobs into the directory path. With count, the first
+        count jobs already in path are kept and new jobs are appended after them.
+        """
+        super().__init__(path, JOB_COLUMNS, chunk_size, count)
+
+        self._id = self._arrays['id']
+        self._submit = self._arrays['submit']
+        self._start = self._arrays['start']
+        self._end = self._arrays['end']
+        self._nodes = self._arrays['nodes']
+        self._walltime = self._arrays['walltime']
+        self._runtime = self._arrays['runtime']
+        self._wait = self._arrays['wait']
+        self._slowdown = self._arrays['slowdown']
+
+    def record(self, job, slowdown):
+        """
+        Appends one finished job and its bounded slowdown.
+        """
+        n = self._n
+        self._id[n] = job.id
+        self._submit[n] = job.res_submit_ts
+        self._start[n] = job.res_run_ts
+        self._end[n] = job.res_end_ts
+        self._nodes[n] = job.resources
+        self._walltime[n] = job.walltime
+        self._runtime[n] = job.res_end_ts - job.res_run_ts
+        self._wait[n] = job.res_run_ts - job.res_submit_ts
+        self._slowdown[n] = slowdown
+        self._n = n + 1
+        if self._n == self.chunk_size:
+            self.flush()
+
+
+class JobResults:
+    """
+    Memory-mapped reader of a directory written by JobRecorder, one array attribute per column.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        _, columns = read_columns(path)
+
+        self.columns = list(columns)
+        for c, array in columns.items():
+            setattr(self, c, array)
+
+    def __len__(self):
+        return len(self.id)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Returns the jobs in the order they finished, one column per field.
+        """
+        return pd.DataFrame({c: np.array(getattr(self, c)) for c in self.columns})
+
+def read_job_results(path) -> JobResults:
+    """
+    Reads the finished jobs written by JobRecorder.
+    """
+    return JobResults(path)
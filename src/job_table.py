@@ -0,0 +1,80 @@
+"""
+JobTable
+
+Id-indexed columnar store of the job trace.
+
+The table is built once from the jobs dataframe and keeps one NumPy array per
+field, so looking up a job during the simulation is a dict lookup plus an
+array index instead of a boolean mask over the whole dataframe.
+"""
+import numpy as np
+import pandas as pd
+
+from input_read import DfFileds
+
+__metaclass__ = type
+
+
+class JobTable:
+
+    # Columns copied out of the jobs dataframe
+    columns = [
+        'id',
+        'submit',
+        'wait',
+        'run',
+        'used_proc',
+        'req_proc',
+        'req_time',
+    ]
+
+    def __init__(self, df_jobs: pd.DataFrame):
+        for c in self.columns:
+            setattr(self, c, df_jobs[c].to_numpy(dtype=np.int64, copy=True))
+
+        # Columns the simulator reads per event
+        self._resources = getattr(self, DfFileds.Job.REQ_PROC)
+        self._walltime = getattr(self, DfFileds.Job.REQ_T)
+        self._runtime = getattr(self, DfFileds.Job.RUN_T)
+
+        # Job id -> row in the arrays
+        self._index: dict[int, int] = {job_id: row for row, job_id in enumerate(self.id.tolist())}
+
+        if len(self._index) != len(self.id):
+            raise ValueError('Job ids in the job log are not unique')
+
+    def __len__(self):
+        return len(self.id)
+
+    def __contains__(self, job_id):
+        return job_id in self._index
+
+    def row(self, job_id) -> int:
+        """
+        Returns the row of a job given its id.
+        """
+        return self._index[job_id]
+
+    def resources(self, job_id) -> int:
+        """
+        Returns the number of resources the job runs on.
+        """
+        return int(self._resources[self._index[job_id]])
+
+    def walltime(self, job_id) -> int:
+        """
+        Returns the requested walltime of the job.
+        """
+        return int(self._walltime[self._index[job_id]])
+
+    def runtime(self, job_id) -> int:
+        """
+        Returns the actual runtime of the job.
+        """
+        return int(self._runtime[self._index[job_id]])
+
+    def release(self, job_id):
+        """
+        Called once a job ended, the table keeps every job.
+        """
+        pass
@@ -0,0 +1,205 @@
+"""
+Schedulus command line
+
+    schedulus run --trace X [--system Y] --out Z [--profile]
+    schedulus batch <manifest> [--workers N] [--profile]
+
+A batch manifest is a JSON file with a list of runs and/or a grid of runs.
+Relative paths are taken from the directory of the manifest:
+
+    {
+        "out": "output/sweep",
+        "runs": [
+            {"trace": "data/pbs/input/job_log.swf", "system": "data/pbs/input/system.json", "out": "output/pbs", "seed": 0}
+        ],
+        "grid": {
+            "traces": [["data/theta22/input/theta22.swf", null]],
+            "nodes": [4360, 8720],
+            "policies": ["easy", "fcfs"],
+            "seeds": [0, 1]
+        }
+    }
+"""
+import argparse
+import json
+import os
+import sys
+
+# The modules of the package import each other as top level modules
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import asynclogger
+from profiler import Profiler
+from sweep import RunConfig, grid, run_one, run_many
+
+__metaclass__ = type
+
+PHASES = ['load', 'init', 'simulate', 'flush']
+
+LOG_LEVELS = {
+    'debug': asynclogger.DEBUG,
+    'info': asynclogger.INFO,
+    'warning': asynclogger.WARNING,
+    'off': asynclogger.OFF,
+}
+
+
+def _simulator_options(args) -> dict:
+    options = {
+        'engine': args.engine,
+        'placement': args.placement,
+        'batch_events': args.batch_events,
+        'record_events': args.record_events,
+    }
+    if args.log_level is not None:
+        level = LOG_LEVELS[args.log_level]
+        options['log_levels'] = {name: level for name in ('simulator', 'scheduler', 'allocator')}
+    if args.profile_cycles:
+        options['profiler'] = Profiler()
+    if args.checkpoint_every is not None:
+        options['checkpoint_every'] = args.checkpoint_every
+    return options
+
+def _print_profile(result: dict):
+    for phase in PHASES:
+        key = f't_{phase}'
+        if key in result:
+            print(f'{phase:>10} {result[key]:10.3f} s')
+    print(f'{"total":>10} {result["t_total"]:10.3f} s')
+    if result.get('events'):
+        print(f'{result["events"]} events, {result["events"] / result["t_simulate"]:.0f} events/s')
+
+def _resolve(base, path):
+    if path is None or os.path.isabs(path):
+        return path
+    return os.path.join(base, path)
+
+def read_manifest(path) -> list[RunConfig]:
+    """
+    Reads the runs of a batch manifest.
+    """
+    with open(path, 'r') as f:
+        manifest = json.load(f)
+
+    base = os.path.dirname(os.path.abspath(path))
+    out_root = _resolve(base, manifest.get('out', 'output'))
+    options = manifest.get('options', {})
+
+    configs = []
+    for i, run in enumerate(manifest.get('runs', [])):
+        configs.append(RunConfig(
+            trace=_resolve(base, run['trace']),
+            system=_resolve(base, run.get('system')),
+            output_dir=_resolve(base, run.get('out', os.path.join(out_root, f'run_{i}'))),
+            nodes=run.get('nodes'),
+            policy=run.get('policy', 'easy'),
+            seed=run.get('seed'),
+            options={**options, **run.get('options', {})},
+        ))
+
+    if 'grid' in manifest:
+        g = manifest['grid']
+        traces = [(_resolve(base, t), _resolve(base, s)) for t, s in g['traces']]
+        configs += grid(
+            traces,
+            g.get('nodes', [None]),
+            g.get('policies', ['easy']),
+            g.get('seeds', [0]),
+            out_root,
+            options,
+        )
+
+    if not configs:
+        raise ValueError(f'Manifest {path} has no runs')
+    for config in configs:
+        if config.options.get('engine') == 'simulus' and config.options.get('checkpoint_every') is not None:
+            raise ValueError(f'Run {config.name} checkpoints on the simulus engine, only the heap engine can be checkpointed')
+    return configs
+
+
+def cmd_run(args) -> int:
+    config = RunConfig(
+        trace=args.trace,
+        system=args.system,
+        output_dir=args.out,
+        nodes=args.nodes,
+        policy=args.policy,
+        seed=args.seed,
+        options=_simulator_options(args),
+        resume=args.resume,
+    )
+    result = run_one(config)
+
+    if result['error'] is not None:
+        print(result['error'], file=sys.stderr)
+        return 1
+
+    print(f'{config.name}: avg wait {result["avg_wait"]:.1f} s, utilization {result["avg_utilization"]:.3f}, '
+          f'bounded slowdown {result["avg_bounded_slowdown"]:.2f}')
+    if args.profile:
+        _print_profile(result)
+        with open(os.path.join(args.out, 'phases.json'), 'w') as f:
+            json.dump({p: result[f't_{p}'] for p in PHASES + ['total'] if f't_{p}' in result}, f, indent=2)
+    return 0
+
+def cmd_batch(args) -> int:
+    configs = read_manifest(args.manifest)
+    summary_path = args.summary or os.path.join(os.path.dirname(configs[0].output_dir), 'summary.csv')
+    summary = run_many(configs, args.workers, summary_path)
+
+    columns = ['name', 'avg_wait', 'avg_utilization', 'avg_bounded_slowdown']
+    if args.profile:
+        columns += [f't_{p}' for p in PHASES] + ['t_total']
+    print(summary[[c for c in columns if c in summary]].to_string(index=False))
+    print(f'Summary in {summary_path}')
+
+    failed = summary[summary['error'].notna()]
+    for _, row in failed.iterrows():
+        print(f'Run {row["name"]} failed:\n{row["error"]}', file=sys.stderr)
+    return 1 if len(failed) > 0 else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='schedulus', description='Discrete event simulator for HPC job scheduling.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='Simulate one trace')
+    run.add_argument('--trace', required=True, help='Job log (swf)')
+    run.add_argument('--system', default=None, help='System config, defaults to the swf header')
+    run.add_argument('--out', required=True, help='Output directory')
+    run.add_argument('--nodes', type=int, default=None, help='Overrides the number of nodes')
+    run.add_argument('--policy', default='easy', choices=['easy', 'fcfs'])
+    run.add_argument('--seed', type=int, default=None, help='Allocator seed')
+    run.add_argument('--placement', default='random', choices=['random', 'lifo'])
+    run.add_argument('--engine', default='heap', choices=['heap', 'simulus'])
+    run.add_argument('--batch-events', action='store_true', help='Skip the scheduling cycles that could not start any job')
+    run.add_argument('--record-events', action='store_true', help='Also write the columnar event trace')
+    run.add_argument('--log-level', default=None, choices=list(LOG_LEVELS), help='Level of the component logs')
+    run.add_argument('--profile', action='store_true', help='Print the time of each phase (load, init, simulate, flush)')
+    run.add_argument('--profile-cycles', action='store_true', help='Time the event handlers and scheduling cycle phases into profile.json and profile.folded')
+    run.add_argument('--checkpoint-every', type=float, default=None, help='Simulated hours between checkpoints to OUT/checkpoint.pkl')
+    run.add_argument('--resume', default=None, help='Continue from a checkpoint, taken on the same trace')
+    run.set_defaults(func=cmd_run)
+
+    batch = commands.add_parser('batch', help='Simulate the runs of a manifest in parallel')
+    batch.add_argument('manifest', help='JSON manifest')
+    batch.add_argument('--workers', type=int, default=None, help='Worker processes, defaults to the number of cores')
+    batch.add_argument('--summary', default=None, help='Summary CSV path')
+    batch.add_argument('--profile', action='store_true', help='Include the time of each phase in the summary')
+    batch.set_defaults(func=cmd_batch)
+
+    return parser
+
+def cli(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    # Checkpoints hold the heap engine's event list
+    if args.command == 'run' and args.engine != 'heap' and (args.checkpoint_every is not None or args.resume is not None):
+        parser.error(f'--checkpoint-every and --resume need --engine heap, got --engine {args.engine}')
+
+    sys.exit(args.func(args))
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,133 @@
+"""
+Metrics
+
+Time series of the simulator state, sampled at a fixed simulated interval or
+after every scheduler event.
+
+Samples go into preallocated typed arrays that either double when full, or
+wrap around as a bounded ring keeping the most recent samples.
+"""
+import numpy as np
+import pandas as pd
+
+__metaclass__ = type
+
+# Column name -> dtype
+METRIC_COLUMNS = {
+    'time': np.int64,
+    'utilization': np.float64,
+    'queue_length': np.int64,
+    'running': np.int64,
+    'avg_wait': np.float64,
+}
+
+
+class MetricsRecorder:
+
+    def __init__(self, interval=None, on_change=False, capacity=4096, ring=False):
+        """
+        Samples every interval simulated seconds, and/or after every scheduler
+        event if on_change. With ring, only the last capacity samples are kept.
+        """
+        if interval is None and not on_change:
+            raise ValueError('Either an interval or on_change is needed')
+        if interval is not None and interval <= 0:
+            raise ValueError('Interval must be positive')
+
+        self.interval = interval
+        self.on_change = on_change
+        self.ring = ring
+        self.simulator = None
+
+        self._arrays = {c: np.empty(capacity, dtype=dtype) for c, dtype in METRIC_COLUMNS.items()}
+        self._capacity = capacity
+
+        # Samples taken so far, in ring mode the next one goes to _n % capacity
+        self._n = 0
+
+        # Next interval sample time
+        self.next_time = None
+
+    def attach(self, simulator, start_time):
+        """
+        Starts sampling the simulator from start_time.
+        """
+        self.simulator = simulator
+        if self.interval is not None:
+            self.next_time = start_time
+
+    def __len__(self):
+        return min(self._n, self._capacity) if self.ring else self._n
+
+    def sample(self, t):
+        """
+        Records the current state of the simulator at time t.
+        """
+        scheduler = self.simulator.scheduler
+        self._append(
+            t,
+            self.simulator.allocator.resource_utilization(),
+            scheduler.queue_length(),
+            scheduler.running_count(),
+            scheduler.average_wait_time()
+        )
+
+    def catch_up(self, now):
+        """
+        Samples every interval time up to and including now, with the state before
+        the events at now. Call before processing an event.
+        """
+        if self.next_time is None:
+            return
+        while self.next_time <= now:
+            self.sample(self.next_time)
+            self.next_time += self.interval
+
+    def _append(self, *values):
+        i = self._n
+        if i >= self._capacity:
+            if self.ring:
+                i = i % self._capacity
+            else:
+                self._grow()
+        for array, value in zip(self._arrays.values(), values):
+            array[i] = value
+        self._n += 1
+
+    def _grow(self):
+        self._capacity *= 2
+        for c, array in self._arrays.items():
+            grown = np.empty(self._capacity, dtype=array.dtype)
+            grown[:len(array)] = array
+            self._arrays[c] = grown
+
+    def to_arrays(self) -> dict[str, np.ndarray]:
+        """
+        Returns a copy of the samples per column, oldest first.
+        """
+        if self.ring and self._n > self._capacity:
+            # Oldest sample sits right after the last one written
+            start = self._n % self._capacity
+            return {c: np.concatenate((a[start:], a[:start])) for c, a in self._arrays.items()}
+        return {c: a[:len(self)].copy() for c, a in self._arrays.items()}
+
+    def to_dataframe(self) -> pd.DataFrame:
+        return pd.DataFrame(self.to_arrays())
+
+    def save(self, path):
+        """
+        Writes the samples to an .npz file, or a CSV file if path ends with .csv.
+        """
+        if path.endswith('.csv'):
+            self.to_dataframe().to_csv(path, index=False)
+        else:
+            np.savez(path, **self.to_arrays())
+
+    def checkpoint_state(self) -> dict:
+        """
+        Returns the samples taken so far and the next sample time.
+        """
+        return {k: v for k, v in vars(self).items() if k != 'simulator'}
+
+    def restore_state(self, state: dict):
+        vars(self).update(state)
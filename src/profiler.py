@@ -0,0 +1,161 @@
+"""
+Profiler
+
+Wall-clock instrumentation of the simulator.
+
+Counts and times every event handler, with a log2 latency histogram per
+event type, and accumulates the time of each phase of the scheduling cycle
+under the handler that ran it. Everything is aggregated in memory, and
+saved at cleanup as a JSON summary plus folded stacks that flamegraph.pl
+or speedscope read directly.
+"""
+import json
+import os
+import time
+from typing import Callable
+
+__metaclass__ = type
+
+# Histogram buckets, bucket i counts latencies in [2^(i-1), 2^i) nanoseconds
+NUM_BUCKETS = 64
+
+ROOT = 'simulator'
+
+
+class Profiler:
+
+    def __init__(self):
+        # Handler running right now, phases are recorded under it
+        self.current = ROOT
+
+        # Stack ('submit;cycle;backfill') -> total seconds and number of calls
+        self._totals: dict[str, float] = {}
+        self._counts: dict[str, int] = {}
+
+        # Event name -> latency histogram of its handler
+        self._histograms: dict[str, list[int]] = {}
+
+    def add(self, path, seconds):
+        """
+        Adds the time of one phase, path is relative to the running handler, e.g. 'cycle;backfill'.
+        """
+        key = f'{self.current};{path}'
+        self._totals[key] = self._totals.get(key, 0.0) + seconds
+        self._counts[key] = self._counts.get(key, 0) + 1
+
+    def wrap(self, handlers: dict[int, Callable], names: dict[int, str]) -> dict[int, Callable]:
+        """
+        Returns the handlers timed, names maps event codes to the names used in the reports.
+        """
+        return {code: self._timed(names[code], handler) for code, handler in handlers.items()}
+
+    def _timed(self, name, handler: Callable) -> Callable:
+        histogram = self._histograms.setdefault(name, [0] * NUM_BUCKETS)
+        totals = self._totals
+        counts = self._counts
+        totals.setdefault(name, 0.0)
+        counts.setdefault(name, 0)
+        perf_counter = time.perf_counter
+
+        def timed(arg):
+            previous = self.current
+            self.current = name
+            t = perf_counter()
+            try:
+                handler(arg)
+            finally:
+                seconds = perf_counter() - t
+                self.current = previous
+                totals[name] += seconds
+                counts[name] += 1
+                histogram[min(int(seconds * 1e9).bit_length(), NUM_BUCKETS - 1)] += 1
+
+        return timed
+
+    def checkpoint_state(self) -> dict:
+        """
+        Returns the totals, counts and histograms so far.
+        """
+        return {
+            'totals': dict(self._totals),
+            'counts': dict(self._counts),
+            'histograms': {name: list(h) for name, h in self._histograms.items()},
+        }
+
+    def restore_state(self, state: dict):
+        # NOTE: Updated in place, the timed handlers hold on to these
+        self._totals.update(state['totals'])
+        self._counts.update(state['counts'])
+        for name, histogram in state['histograms'].items():
+            self._histograms.setdefault(name, [0] * NUM_BUCKETS)[:] = histogram
+
+    def _self_times(self) -> dict[str, float]:
+        # Time of each stack minus the time of its children
+        self_times = dict(self._totals)
+        for key, seconds in self._totals.items():
+            parent, sep, _ = key.rpartition(';')
+            if sep and parent in self_times:
+                self_times[parent] -= seconds
+        return self_times
+
+    def summary(self) -> dict:
+        """
+        Returns the calls and time of every handler and phase, and the handler latency histograms.
+        """
+        handlers = {}
+        for name, histogram in self._histograms.items():
+            count = self._counts[name]
+            handlers[name] = {
+                'count': count,
+                'total': self._totals[name],
+                'mean': self._totals[name] / count if count else 0.0,
+                'p50': _quantile(histogram, 0.5),
+                'p99': _quantile(histogram, 0.99),
+                # Upper bound of the bucket in nanoseconds -> count
+                'histogram': {str(1 << i): n for i, n in enumerate(histogram) if n},
+            }
+
+        phases = {}
+        for key in sorted(self._totals):
+            if key in self._histograms:
+                continue
+            phases[key] = {
+                'count': self._counts[key],
+                'total': self._totals[key],
+            }
+
+        return {'handlers': handlers, 'phases': phases}
+
+    def to_folded(self) -> str:
+        """
+        Returns the self time of every stack in microseconds, one 'a;b;c count' line each.
+        """
+        lines = []
+        for key, seconds in sorted(self._self_times().items()):
+            us = int(seconds * 1e6)
+            if us > 0:
+                lines.append(f'{ROOT};{key} {us}')
+        return '\n'.join(lines) + '\n'
+
+    def save(self, output_dir):
+        """
+        Writes profile.json and profile.folded to output_dir.
+        """
+        with open(os.path.join(output_dir, 'profile.json'), 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+        with open(os.path.join(output_dir, 'profile.folded'), 'w') as f:
+            f.write(self.to_folded())
+
+def _quantile(histogram: list[int], q) -> float:
+    """
+    Returns an upper bound in seconds of the q quantile of a latency histogram.
+    """
+    total = sum(histogram)
+    if total == 0:
+        return 0.0
+    seen = 0
+    for i, n in enumerate(histogram):
+        seen += n
+        if seen >= q * total:
+            return (1 << i) / 1e9
+    return (1 << (NUM_BUCKETS - 1)) / 1e9
@@ -1,18 +1,36 @@
 from dataclasses import dataclass
+from enum import Enum
+import copy
+import hashlib
+import os
+import pickle
+import numpy as np
 import pandas as pd
-import simulus
+from typing import Callable, Iterator
 from components.scheduler import *
 from components.allocator import *
 from input_read import \
 read_event_data, \
 read_job_data, \
+read_swf, \
 read_system_config, \
+read_system_config_swf, \
 read_event_data_job_log, \
-DfFileds, \
 SystemConfig
+from job_table import JobTable
+from engine import Engine, make_engine, INFINITE_TIME
+from arrivals import ArrivalSource, JobStream
+from asynclogger import AsyncLogger, INFO, OFF
+from event_trace import EventRecorder
+from job_results import JobRecorder
+from metrics import MetricsRecorder
+from profiler import Profiler
 
 __metaclass__ = type
 
+# Bumped whenever the layout of checkpoint files changes
+CHECKPOINT_VERSION = 5
+
 class EventType(Enum):
 
     # Scheduler Events
@@ -29,6 +47,9 @@ class EventType(Enum):
     OFFLINE = 9
     ONLINE = 10
 
+# Events after which the scheduler runs a cycle
+DECISION_EVENTS = (EventType.SUBMIT.value, EventType.END.value)
+
 def ET2CHAR(i):
     if i == EventType.SUBMIT:
         return 'Q'
@@ -55,207 +76,634 @@ class SchedulerEvent(Event):
 @dataclass
 class AllocatorEvent(Event):
     resource_id: int
+    job_id: int
+
+@dataclass
+class JobAllocatorEvent(Event):
+    job_id: int
+    resource_ids: np.ndarray
 
 
 class Simulator:
-    def __init__(self):
-        self.sim = None
+    def __init__(
+        self,
+        policy='easy',
+        placement='random',
+        allocator_seed=None,
+        batch_events=False,
+        per_node_alloc_events=False,
+        engine='heap',
+        log_levels=None,
+        record_events=False,
+        record_jobs=True,
+        metrics: MetricsRecorder = None,
+        profiler: Profiler = None,
+        checkpoint_every=None,
+        checkpoint_path=None
+    ):
+        self.engine_type = engine
+        self.engine: Engine = None
+        self._handlers: dict[int, Callable] = None
+        self._arrivals: ArrivalSource = None
         
         self.df_events: pd.DataFrame = None
         self.df_jobs: pd.DataFrame = None
+        self.jobs: JobTable = None
         self.system_config: SystemConfig = None
 
         # Initialize components
         self.allocator = None
         self.scheduler = None
+        self.policy = policy
+        self.placement = placement
+        self.allocator_seed = allocator_seed
+
+        # Skip the scheduling cycles that could not start any job, e.g. after each submit of
+        # a burst while the machine is full. The decisions are the same as in per-event mode
+        self.batch_events = batch_events
+
+        # Debug mode: one allocator event per resource instead of one per job
+        self.per_node_alloc_events = per_node_alloc_events
 
         self.output_dir = None
         self.logger: AsyncLogger = None
         self.event_logger: AsyncLogger = None
+        # Resource ids of the job level allocator events, events.log keeps 3 columns
+        self.alloc_logger: AsyncLogger = None
 
+        # Logger name (simulator, events, scheduler, allocator) -> level
+        self.log_levels: dict[str, int] = log_levels or {}
 
-    def log(self, s):
-        self.logger.write_log(f'{self.now()} {s}')
+        # Also record the events in columnar binary files under output_dir/events
+        self.record_events = record_events
+        self.recorder: EventRecorder = None
 
-    def log_event(self, s):
-        self.event_logger.write_log(f'{self.now()},{s}')
+        # Write the finished jobs to output_dir/jobs, see job_results.py
+        self.record_jobs = record_jobs
+        self.job_recorder: JobRecorder = None
+
+        # Time series of the simulator state, sampled while simulating
+        self.metrics: MetricsRecorder = metrics
+
+        # Times the event handlers and the scheduling cycle phases, saved at cleanup
+        self.profiler: Profiler = profiler
+
+        # Checkpoint to checkpoint_path (default output_dir/checkpoint.pkl) every
+        # checkpoint_every simulated hours while simulating
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_path = checkpoint_path
+        self._next_checkpoint = None
+
+
+    def log(self, fmt, *args, level=INFO):
+        self.logger.log_at(self.now(), fmt, *args, level=level)
+
+    def log_event(self, *fields):
+        """
+        Writes an event record: time,field,...
+        """
+        self.event_logger.write_fmt(INFO, '%s' + ',%s' * len(fields), self.now(), *fields)
+
+    def record_event(self, event_type: EventType, id, count=0):
+        """
+        Appends an event to the columnar event trace, if recording.
+        """
+        if self.recorder is not None:
+            self.recorder.record(self.engine.now, event_type.value, id, count)
 
 
     def read_data(self, path_job_log, path_system_config, job_log_CSV=False):
         self.df_jobs: pd.DataFrame = read_job_data(path_job_log, CSV=job_log_CSV)
+        self.jobs: JobTable = JobTable(self.df_jobs)
         self.system_config: SystemConfig = read_system_config(path_system_config)
         self.df_events: pd.DataFrame = read_event_data_job_log(self.df_jobs)
 
     def read_data_swf(self, path_swf):
-        raise NotImplementedError('Need to implement reading swf along with system config')
-        self.df_events: pd.DataFrame = None
-        self.df_jobs: pd.DataFrame = None
-        self.system_config: SystemConfig = None
+        self.df_jobs, header = read_swf(path_swf)
+        self.jobs: JobTable = JobTable(self.df_jobs)
+        self.system_config: SystemConfig = read_system_config_swf(header)
+        self.df_events: pd.DataFrame = read_event_data_job_log(self.df_jobs)
 
     def read_data_with_events(self, path_job_log, path_system_config, path_event_log, job_log_CSV=False):
-        self.df_jobs: pd.DataFrame = read_job_data(path_job_log, job_log_CSV=job_log_CSV)
+        self.df_jobs: pd.DataFrame = read_job_data(path_job_log, CSV=job_log_CSV)
+        self.jobs: JobTable = JobTable(self.df_jobs)
         self.system_config: SystemConfig = read_system_config(path_system_config)
         self.df_events: pd.DataFrame = read_event_data(path_event_log)
         pass
 
+    def read_data_frame(self, df_jobs: pd.DataFrame, system_config: SystemConfig, df_events: pd.DataFrame = None):
+        """
+        Uses jobs already read into a dataframe with the swf columns. The submit
+        events default to one per job.
+        """
+        self.df_jobs = df_jobs
+        self.jobs: JobTable = JobTable(self.df_jobs)
+        self.system_config = system_config
+        self.df_events = df_events if df_events is not None else read_event_data_job_log(self.df_jobs)
+
+    def read_data_stream(self, chunks: Iterator[pd.DataFrame], system_config: SystemConfig):
+        """
+        Streams the jobs from dataframe chunks with the swf columns sorted by submit
+        time, e.g. WorkloadGenerator.chunks(), without reading the whole trace.
+        """
+        self.jobs = JobStream(chunks)
+        self._arrivals = self.jobs
+        self.system_config = system_config
+
     def now(self):
-        return self.sim.now
+        return self.engine.now
+
+    def _event_handlers(self) -> dict[int, Callable]:
+        """
+        Returns the handler of every event code the simulator schedules.
+        """
+        return {
+            EventType.SUBMIT.value: self._on_submit,
+            EventType.START.value: self._on_start,
+            EventType.END.value: self._on_end,
+            EventType.ALLOCATE.value: self._on_allocate,
+            EventType.DEALLOCATE.value: self._on_deallocate,
+        }
+
+    def schedule_event(self, event_type: EventType, arg, time, prio=0):
+        """
+        Schedules an event on the engine.
+        """
+        self.engine.sched(event_type.value, arg, until=time, prio=prio)
 
     def handle_scheduler_event(self, e: SchedulerEvent):
-        # print(f"{self.sim.now},{ET2CHAR(e.type)},{e.job_id}")
-        self.log_event(f'{ET2CHAR(e.type)},{e.job_id}')
-        
-        # Get the job data related to the event
-        job_data = self.df_jobs[self.df_jobs[DfFileds.Job.ID] == e.job_id]
-
-        # Handle the event
-        if e.type == EventType.SUBMIT:
-
-            # Queue the job 
-            self.scheduler.queue(
-                Job(
-                    id=e.job_id,
-                    name=f'job.{e.job_id}',
-                    resources=job_data[DfFileds.Job.REQ_PROC].item(),
-                    walltime=job_data[DfFileds.Job.REQ_T].item(),
-                    runtime=job_data[DfFileds.Job.RUN_T].item()
-                )
-            )
+        if e.type not in (EventType.SUBMIT, EventType.START, EventType.END):
+            raise NotImplementedError(f'Event {e.type} not implemented!')
+        self._handlers[e.type.value](e.job_id)
 
-        elif e.type == EventType.START:
+    def handle_allocator_event(self, e: AllocatorEvent | JobAllocatorEvent):
+        if e.type not in (EventType.ALLOCATE, EventType.DEALLOCATE):
+            raise NotImplementedError(f'Event {e.type} not implemented!')
+        if isinstance(e, JobAllocatorEvent):
+            self._handlers[e.type.value]((e.job_id, e.resource_ids))
+        else:
+            self._handlers[e.type.value]((e.job_id, np.array([e.resource_id], dtype=np.int64)))
 
-            # Start the job
-            self.scheduler.start(e.job_id)
+    def _on_submit(self, job_id):
+        self._before_event()
+        self.log_event(ET2CHAR(EventType.SUBMIT), job_id)
+        self.record_event(EventType.SUBMIT, job_id)
 
-            # Schedule the job end event
-            e = SchedulerEvent(
-                time=self.sim.now + job_data[DfFileds.Job.RUN_T].item(),
-                type=EventType.END,
-                job_id=e.job_id
-            )
-            
-            self.sim.sched(self.handle_scheduler_event, e, until=e.time)
-            self.log(f'Scheduled: End event at {e.time} for job {e.job_id}. Expected to end at {self.sim.now + job_data[DfFileds.Job.REQ_T].item()}')
+        # Feed the arrival after this one
+        self._schedule_next_arrival()
 
-        elif e.type == EventType.END:
-            self.scheduler.end(e.job_id)
-            pass
-        else:
-            raise NotImplementedError(f'Event {e.type} not implemented!')
+        # Queue the job 
+        self.scheduler.queue(self._new_job(job_id))
 
-    def handle_allocator_event(self, e: AllocatorEvent):
-        # print(f"{self.sim.now},{ET2CHAR(e.type)},{e.job_id}")
-        self.log_event(f'{ET2CHAR(e.type)},{e.resource_id}')
-        if e.type == EventType.ALLOCATE:
-            pass
-        elif e.type == EventType.DEALLOCATE:
-            pass
-        else:
-            raise NotImplementedError(f'Event {e.type} not implemented!')
+        self._after_event()
 
-    def create_run_event(self, job_id):
-        # print(f'Creating run event for: {job_id}')
-        e = SchedulerEvent(
-            time=self.sim.now,
-            type=EventType.START,
-            job_id=job_id
-        )
-        self.sim.sched(
-            self.handle_scheduler_event,
-            e, 
-            until=e.time
+    def _new_job(self, job_id) -> Job:
+        return Job(
+            id=job_id,
+            resources=self.jobs.resources(job_id),
+            walltime=self.jobs.walltime(job_id),
+            runtime=self.jobs.runtime(job_id)
         )
-        self.log(f'Scheduled: Run event at {e.time} for job {job_id}.')
-        return e.time
 
-    def create_alloc_event(self, resource_id):
-        # print(f'Creating run event for: {job_id}')
-        e = AllocatorEvent(
-            time=self.sim.now,
-            type=EventType.ALLOCATE,
-            resource_id=resource_id
-        )
-        self.sim.sched(
-            self.handle_allocator_event,
-            e,
-            until=e.time,
-        )
+    def _on_start(self, job_id):
+        self._before_event()
+        self.log_event(ET2CHAR(EventType.START), job_id)
+        self.record_event(EventType.START, job_id)
+
+        # Start the job
+        self.scheduler.start(job_id)
+
+        # Schedule the job end event
+        end_time = self.engine.now + self.jobs.runtime(job_id)
+        self.schedule_event(EventType.END, job_id, end_time)
+        self.log('Scheduled: End event at %s for job %s. Expected to end at %s', end_time, job_id, self.engine.now + self.jobs.walltime(job_id))
+
+        self._after_event()
+
+    def _on_end(self, job_id):
+        self._before_event()
+        self.log_event(ET2CHAR(EventType.END), job_id)
+        self.record_event(EventType.END, job_id)
+
+        self.scheduler.end(job_id)
+        self.jobs.release(job_id)
+
+        self._after_event()
+
+    def _on_allocate(self, arg):
+        self._before_event()
+        self._log_allocator_event(EventType.ALLOCATE, arg)
+
+    def _on_deallocate(self, arg):
+        self._before_event()
+        self._log_allocator_event(EventType.DEALLOCATE, arg)
+
+    def _log_allocator_event(self, event_type: EventType, arg):
+        # time,CHAR,job id in events.log, and time,CHAR,job id,resource id ranges in allocations.log
+        job_id, resource_ids = arg
+        self.log_event(ET2CHAR(event_type), job_id)
+        if self.alloc_logger.is_enabled(INFO):
+            self.alloc_logger.write_fmt(INFO, '%s,%s,%s,%s', self.now(), ET2CHAR(event_type), job_id, encode_ranges(resource_ids))
+        self.record_event(event_type, job_id, len(resource_ids))
+
+    def _before_event(self):
+        """
+        Takes the interval metric samples due before the current event.
+        """
+        if self.metrics is not None and self.metrics.next_time is not None and self.engine.now >= self.metrics.next_time:
+            self.metrics.catch_up(self.engine.now)
+
+    def _after_event(self):
+        """
+        Runs after every scheduler event: samples metrics on change.
+        """
+        if self.metrics is not None and self.metrics.on_change:
+            self.metrics.sample(self.engine.now)
 
-    def create_dealloc_event(self, resource_id):
+    def create_run_event(self, job_id):
         # print(f'Creating run event for: {job_id}')
-        e = AllocatorEvent(
-            time=self.sim.now,
-            type=EventType.DEALLOCATE,
-            resource_id=resource_id
-        )
-        self.sim.sched(
-            self.handle_allocator_event,
-            e,
-            until=e.time
-        )
+        t = self.engine.now
+        self.schedule_event(EventType.START, job_id, t)
+        self.log('Scheduled: Run event at %s for job %s.', t, job_id)
+        return t
+
+    def create_alloc_event(self, job_id, resource_ids):
+        self._create_allocator_events(EventType.ALLOCATE, job_id, resource_ids)
+
+    def create_dealloc_event(self, job_id, resource_ids):
+        self._create_allocator_events(EventType.DEALLOCATE, job_id, resource_ids)
+
+    def _create_allocator_events(self, event_type: EventType, job_id, resource_ids):
+        """
+        Schedules one allocator event for the job, or one per resource in per node mode.
+        Both carry the job id, per node events only one of its resources.
+        """
+        t = self.engine.now
+        if self.per_node_alloc_events:
+            resource_ids = np.asarray(resource_ids)
+            for i in range(len(resource_ids)):
+                self.schedule_event(event_type, (job_id, resource_ids[i:i + 1]), t)
+        else:
+            self.schedule_event(event_type, (job_id, resource_ids), t)
         
-    def initialize(self, output_dir):
+    def initialize(self, output_dir, start_time=None):
+        """
+        Sets up the components and events. The clock starts at the first submit,
+        or at start_time if given, e.g. to warm_start() jobs before it.
+        """
 
         # Make sure data was read
-        if self.df_jobs is None:
+        streaming = isinstance(self.jobs, JobStream)
+        if self.df_jobs is None and not streaming:
             raise EnvironmentError('Jobs Df was None')
+
+        if self.jobs is None:
+            raise EnvironmentError('Job table was None')
         
         if self.system_config is None:
             raise EnvironmentError('Sys Config was None')
         
-        if self.df_events is None:
+        if self.df_events is None and not streaming:
             raise EnvironmentError('Event Df was None')
-        
+
+        start_time = self._setup(output_dir, start_time)
+        self.allocator.start_accounting(start_time)
+        if self.metrics is not None:
+            self.metrics.attach(self, start_time)
+        if self.checkpoint_every is not None:
+            self._next_checkpoint = start_time + self.checkpoint_every * 3600
+
+        self._schedule_next_arrival()
+
+    def _setup(self, output_dir, start_time=None, append=False, recorded=0, recorded_jobs=0, arrivals: ArrivalSource = None):
+        """
+        Creates the loggers, components, arrival source (unless given) and engine, and
+        returns the start time, by default the first submit time. With append the logs
+        and recorders continue the files in output_dir.
+        """
         self.output_dir = output_dir
-        self.logger = AsyncLogger(f'{self.output_dir}/simulator.log')
-        self.event_logger = AsyncLogger(f'{self.output_dir}/events.log')
+        self.logger = AsyncLogger(f'{self.output_dir}/simulator.log', name='simulator', append=append)
+        self.event_logger = AsyncLogger(f'{self.output_dir}/events.log', name='events', append=append)
+        self.alloc_logger = AsyncLogger(f'{self.output_dir}/allocations.log', name='allocations', append=append)
         
 
         # Initialize components
-        self.allocator = Allocator(self, self.system_config.nodes, self.output_dir)
-        self.scheduler = Scheduler(self, self.output_dir)
-            
-        start_time: int = -1
-        submit_events: list[SchedulerEvent] = []
+        self.allocator = Allocator(
+            self,
+            self.system_config.nodes,
+            self.output_dir,
+            placement=self.placement,
+            seed=self.allocator_seed,
+            append_log=append
+        )
+        self.scheduler = Scheduler(self, self.output_dir, policy=self.policy, append_log=append)
+        self.scheduler.batch = self.batch_events
 
-        # Get all the submit evetns
-        df_submit_events = self.df_events[self.df_events[DfFileds.Event.TYPE] == 'Q']
-        for index, row in df_submit_events.iterrows():
-            
-            e = SchedulerEvent(
-                time=row[DfFileds.Event.TIME],
-                type=EventType.SUBMIT,
-                job_id=row[DfFileds.Event.JOB_ID]
-            )
-            
-            if start_time == -1:
-                start_time = e.time
+        for name, level in self.log_levels.items():
+            self.set_log_level(name, level)
 
-            submit_events.append(e)
+        if self.record_events:
+            self.recorder = EventRecorder(
+                f'{self.output_dir}/events',
+                {t.value: ET2CHAR(t) for t in EventType},
+                count=recorded
+            )
 
-        # Define the simulator
+        if self.record_jobs:
+            self.job_recorder = JobRecorder(f'{self.output_dir}/jobs', count=recorded_jobs)
+            self.scheduler.job_recorder = self.job_recorder
+            
+        # Stream the submit events, only the next one is kept on the event list
+        if arrivals is not None:
+            self._arrivals = arrivals
+        elif not isinstance(self.jobs, JobStream):
+            self._arrivals = ArrivalSource.from_events(self.df_events)
+        first_time = self._arrivals.first_time()
+        if start_time is None:
+            start_time = first_time
+            if start_time is None:
+                raise EnvironmentError('No submit events')
+        elif first_time is not None and first_time < start_time:
+            raise ValueError(f'Submit events at {first_time} are before the start time {start_time}')
+
+        # Define the event engine
         # Init the time to the first submit event
-        self.sim = simulus.simulator(name = 'schedulus', init_time = start_time)
-
-
-        # Schedule all the submit events
-        for e in submit_events:
-            self.sim.sched(self.handle_scheduler_event, e, until=e.time)
+        self._handlers = self._event_handlers()
+        if self.profiler is not None:
+            self._handlers = self.profiler.wrap(self._handlers, {t.value: t.name.lower() for t in EventType})
+            self.scheduler.profiler = self.profiler
+        self.engine = make_engine(self.engine_type, self._handlers, init_time=start_time)
+        return start_time
+
+    def warm_start(self, running: list[tuple[int, int, int]], queued: list[tuple[int, int]]):
+        """
+        Puts in place the jobs already running or queued at the start time, e.g.
+        from the wait and run fields of a trace. running holds (job id, submit, start)
+        and queued (job id, submit), both in submit order. Call right after initialize().
+        """
+        started = self.scheduler.warm_start(
+            [(self._new_job(job_id), submit, start) for job_id, submit, start in running],
+            [(self._new_job(job_id), submit) for job_id, submit in queued]
+        )
 
-    def simulate(self):
+        # The running jobs end when they did in the trace
+        for job in started:
+            self.schedule_event(EventType.END, job.id, max(job.res_run_ts + job.runtime, self.now()))
+
+    def _schedule_next_arrival(self):
+        """
+        Schedules the next submit event of the trace, if any.
+        """
+        arrival = next(self._arrivals, None)
+        if arrival is None:
+            return
+
+        # NOTE: Submits go before other events at the same time, as if they
+        # had all been scheduled at the start. A submit pulls the next one
+        # in, so every submit of an instant runs before its starts and ends.
+        # Both engines order same time events by priority, see engine.py
+        t, job_id = arrival
+        self.schedule_event(EventType.SUBMIT, job_id, t, prio=-1)
+
+    def loggers(self) -> dict[str, AsyncLogger]:
+        return {
+            'simulator': self.logger,
+            'events': self.event_logger,
+            'allocations': self.alloc_logger,
+            'scheduler': self.scheduler.logger,
+            'allocator': self.allocator.logger,
+        }
+
+    def set_log_level(self, name, level):
+        """
+        Sets the level of one component's logger, e.g. set_log_level('scheduler', DEBUG).
+        """
+        loggers = self.loggers()
+        if name not in loggers:
+            raise ValueError(f'Unknown logger {name}, expected one of {list(loggers)}')
+        loggers[name].set_level(level)
+
+    def simulate(self, until=None):
         # Run the simulation
-        self.sim.run()
+        if self.checkpoint_every is None:
+            self.engine.run(until=until)
+            return
+
+        # Stop before the first event at or after every checkpoint time, so
+        # checkpoints always fall between two instants
+        interval = self.checkpoint_every * 3600
+        upper = INFINITE_TIME if until is None else until
+        while len(self.engine) > 0 and self._next_checkpoint < upper:
+            processed = self.engine.events_processed
+            self.engine.run(until=self._next_checkpoint, advance=False)
+            if len(self.engine) == 0:
+                break
+            if self.engine.events_processed > processed:
+                self.checkpoint()
+            self._next_checkpoint += interval
+        self.engine.run(until=until)
 
     def step(self):
-        self.sim.step()
+        self.engine.step()
+
+    def step_to_decision(self, policy=None) -> bool:
+        """
+        Processes the next event and the ones after it, up to the next decision
+        point: an event that runs a scheduling cycle (a submit or an end). If given,
+        policy is used from this step on. Returns False once no events are left.
+        """
+        if policy is not None:
+            self.scheduler.set_policy(policy)
+
+        engine = self.engine
+        engine.step()
+        while len(engine) > 0 and engine.peek_code() not in DECISION_EVENTS:
+            engine.step()
+        return len(engine) > 0
+
+    def _trace_digest(self) -> str:
+        if isinstance(self.jobs, JobStream):
+            raise ValueError('A streamed workload can not be checkpointed')
+        digest = hashlib.sha1()
+        for c in JobTable.columns:
+            digest.update(getattr(self.jobs, c).tobytes())
+        return digest.hexdigest()
+
+    def checkpoint(self, path=None):
+        """
+        Saves the state of the simulation so resume(path) continues it with the same events.
+        Call between two events, e.g. once simulate(until) returned.
+        """
+        if path is None:
+            path = self.checkpoint_path or os.path.join(self.output_dir, 'checkpoint.pkl')
+
+        # Everything logged up to now goes to disk, so resuming can cut the logs back to here
+        logs = {}
+        for name, logger in self.loggers().items():
+            logger.flush()
+            size = None if logger.compress else os.path.getsize(logger.log_file)
+            logs[name] = (os.path.basename(logger.log_file), size)
+        if self.recorder is not None:
+            self.recorder.flush()
+        if self.job_recorder is not None:
+            self.job_recorder.flush()
+
+        state = {
+            'version': CHECKPOINT_VERSION,
+            'trace': self._trace_digest(),
+            'options': {
+                'policy': self.policy,
+                'placement': self.placement,
+                'allocator_seed': self.allocator_seed,
+                'batch_events': self.batch_events,
+                'per_node_alloc_events': self.per_node_alloc_events,
+                'engine_type': self.engine_type,
+                'checkpoint_every': self.checkpoint_every,
+            },
+            'output_dir': self.output_dir,
+            'logs': logs,
+            'recorded': self.recorder.count if self.recorder is not None else 0,
+            'recorded_jobs': self.job_recorder.count if self.job_recorder is not None else 0,
+            'engine': self.engine.checkpoint_state(),
+            'arrivals': self._arrivals.position,
+            'allocator': self.allocator.checkpoint_state(),
+            'scheduler': self.scheduler.checkpoint_state(),
+            'metrics': self.metrics.checkpoint_state() if self.metrics is not None else None,
+            'profiler': self.profiler.checkpoint_state() if self.profiler is not None else None,
+            'next_checkpoint': self._next_checkpoint,
+        }
+
+        # Write to a temporary file first so a crash never leaves a partial checkpoint
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def resume(self, path, output_dir=None):
+        """
+        Continues the simulation saved by checkpoint(path), in place of initialize().
+        Read the same trace first.
+
+        Resuming in the checkpointed output_dir cuts its logs back to the checkpoint
+        and appends to them, so they end up as if the run was never interrupted.
+        In another output_dir the logs only hold the events after the checkpoint.
+        """
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+
+        if state['version'] != CHECKPOINT_VERSION:
+            raise ValueError(f'Unsupported checkpoint version {state["version"]}, expected {CHECKPOINT_VERSION}')
+        if self.jobs is None or self.system_config is None:
+            raise EnvironmentError('Read the trace before resuming')
+        if state['trace'] != self._trace_digest():
+            raise ValueError('The checkpoint was taken on a different trace')
+
+        for name, value in state['options'].items():
+            setattr(self, name, value)
+
+        if output_dir is None:
+            output_dir = state['output_dir']
+        in_place = os.path.abspath(output_dir) == os.path.abspath(state['output_dir'])
+        if in_place:
+            for name, (file_name, size) in state['logs'].items():
+                if size is None:
+                    raise ValueError(f'The {name} log is compressed and can not be resumed in place, resume in another output_dir')
+                os.truncate(os.path.join(output_dir, file_name), size)
+
+        self._setup(
+            output_dir,
+            append=in_place,
+            recorded=state['recorded'] if in_place else 0,
+            recorded_jobs=state['recorded_jobs'] if in_place else 0
+        )
+
+        self.engine.restore_state(state['engine'])
+        self._arrivals.seek(state['arrivals'])
+        self.allocator.restore_state(state['allocator'])
+        self.scheduler.restore_state(state['scheduler'])
+        if self.metrics is not None and state['metrics'] is not None:
+            self.metrics.attach(self, self.engine.now)
+            self.metrics.restore_state(state['metrics'])
+        if self.profiler is not None and state['profiler'] is not None:
+            self.profiler.restore_state(state['profiler'])
+        self._next_checkpoint = state['next_checkpoint']
+
+    def fork(self, output_dir, policy=None, log_levels=None) -> 'Simulator':
+        """
+        Returns an independent copy of the simulation at the current time, e.g. to
+        look ahead under another policy. Call between two events.
+
+        The child shares the job table and the submit events with this simulator.
+        The pending events, queues, running jobs and resource state are copied.
+        Its logs go to output_dir, all off unless log_levels says otherwise, and
+        it records no events, finished jobs, metrics, profile or checkpoints.
+        """
+        if isinstance(self.jobs, JobStream):
+            raise ValueError('A streamed workload can not be forked')
+        if policy is None:
+            policy = self.scheduler.policy
+
+        child = Simulator(
+            policy=policy,
+            placement=self.placement,
+            allocator_seed=self.allocator_seed,
+            batch_events=self.batch_events,
+            per_node_alloc_events=self.per_node_alloc_events,
+            engine=self.engine_type,
+            log_levels=log_levels if log_levels is not None else dict.fromkeys(self.loggers(), OFF),
+            record_jobs=False,
+        )
+        child.df_jobs = self.df_jobs
+        child.jobs = self.jobs
+        child.system_config = self.system_config
+        child.df_events = self.df_events
+
+        os.makedirs(output_dir, exist_ok=True)
+        child._setup(output_dir, arrivals=self._arrivals.copy())
+
+        state = copy.deepcopy({
+            'engine': self.engine.checkpoint_state(),
+            'allocator': self.allocator.checkpoint_state(),
+            'scheduler': self.scheduler.checkpoint_state(),
+        })
+        child.engine.restore_state(state['engine'])
+        child.allocator.restore_state(state['allocator'])
+        child.scheduler.restore_state(state['scheduler'])
+        child.scheduler.set_policy(policy)
+        return child
+
+    def lookahead(self, horizon, output_dir, policy=None) -> dict:
+        """
+        Simulates a fork for horizon more seconds (to the end if None) under policy,
+        and returns its observation then. This simulator is left as it is.
+        """
+        child = self.fork(output_dir, policy)
+        child.simulate(until=None if horizon is None else self.now() + horizon)
+        observation = child.observe()
+        child.cleanup()
+        return observation
 
     def cleanup(self):
         self.allocator.logger.stop()
         self.scheduler.logger.stop()
+        self.logger.stop()
+        self.event_logger.stop()
+        self.alloc_logger.stop()
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.job_recorder is not None:
+            self.job_recorder.close()
+        if self.profiler is not None:
+            self.profiler.save(self.output_dir)
 
     def observe(self):
         return {
             "timestamp": self.now(),
             "utilization": self.allocator.resource_utilization(),
-            "avg_wait": self.scheduler.average_wait_time()
+            "avg_wait": self.scheduler.average_wait_time(),
+            "avg_utilization": self.allocator.average_utilization(),
+            "avg_bounded_slowdown": self.scheduler.average_bounded_slowdown(),
+            "queue_length": self.scheduler.queue_length(),
+            "running": self.scheduler.running_count(),
+            "backlog_node_hours": self.scheduler.backlog_node_hours(),
         }
\ No newline at end of file
@@ -0,0 +1,186 @@
+"""
+Sweep
+
+Runs a grid of simulations (trace x node count x policy x allocator seed) over
+a process pool and collects one summary table of metrics and wall-clock cost.
+
+Run from src/:
+    python sweep.py --trace ../data/pbs/input/job_log.swf --system ../data/pbs/input/system.json \
+        --nodes 32 64 --policy easy fcfs --seed 0 1 2 --out ../data/sweep
+"""
+import argparse
+import itertools
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+from simulator import Simulator
+
+__metaclass__ = type
+
+
+@dataclass
+class RunConfig:
+
+    # Job log, and system config (None to take it from the swf header)
+    trace: str
+    system: str | None
+    output_dir: str
+
+    # Overrides the number of nodes of the system config
+    nodes: int | None = None
+    policy: str = 'easy'
+    seed: int | None = None
+
+    # Extra Simulator keyword arguments
+    options: dict = field(default_factory=dict)
+
+    name: str = None
+
+    # Checkpoint to continue from instead of starting at the first submit
+    resume: str | None = None
+
+    def __post_init__(self):
+        if self.name is None:
+            self.name = os.path.basename(self.output_dir)
+
+
+def trace_name(path) -> str:
+    return os.path.splitext(os.path.basename(path))[0]
+
+def grid(traces: list[tuple[str, str | None]], nodes: list[int | None], policies: list[str], seeds: list[int | None], out_root, options: dict = None) -> list[RunConfig]:
+    """
+    Returns one run per combination of (trace, system), node count, policy and seed.
+    """
+    configs = []
+    for (trace, system), n, policy, seed in itertools.product(traces, nodes, policies, seeds):
+        name = f'{trace_name(trace)}_n{n if n is not None else "sys"}_{policy}_s{seed}'
+        configs.append(RunConfig(
+            trace=trace,
+            system=system,
+            output_dir=os.path.join(out_root, name),
+            nodes=n,
+            policy=policy,
+            seed=seed,
+            options=dict(options or {}),
+            name=name,
+        ))
+    return configs
+
+def run_one(config: RunConfig) -> dict:
+    """
+    Runs one simulation and returns its metrics and per phase timings in seconds.
+    """
+    result = {
+        'name': config.name,
+        'trace': config.trace,
+        'nodes': config.nodes,
+        'policy': config.policy,
+        'seed': config.seed,
+        'output_dir': config.output_dir,
+    }
+    phases = {}
+    t_start = time.perf_counter()
+
+    try:
+        os.makedirs(config.output_dir, exist_ok=True)
+        s = Simulator(policy=config.policy, allocator_seed=config.seed, **config.options)
+
+        t = time.perf_counter()
+        if config.system is None:
+            s.read_data_swf(config.trace)
+        else:
+            s.read_data(config.trace, config.system)
+        if config.nodes is not None:
+            s.system_config.nodes = config.nodes
+        phases['load'] = time.perf_counter() - t
+
+        t = time.perf_counter()
+        if config.resume is None:
+            s.initialize(config.output_dir)
+        else:
+            s.resume(config.resume, config.output_dir)
+        phases['init'] = time.perf_counter() - t
+
+        t = time.perf_counter()
+        s.simulate()
+        phases['simulate'] = time.perf_counter() - t
+
+        observation = s.observe()
+
+        t = time.perf_counter()
+        s.cleanup()
+        phases['flush'] = time.perf_counter() - t
+
+        result['nodes'] = s.system_config.nodes
+        result['jobs'] = len(s.jobs)
+        result['events'] = s.engine.events_processed
+        result.update(observation)
+        result['error'] = None
+
+    except Exception:
+        result['error'] = traceback.format_exc()
+
+    for phase, seconds in phases.items():
+        result[f't_{phase}'] = seconds
+    result['t_total'] = time.perf_counter() - t_start
+    return result
+
+def run_many(configs: list[RunConfig], workers=None, summary_path=None) -> pd.DataFrame:
+    """
+    Runs the simulations over a process pool, workers defaults to the number of cores.
+    Returns the summary table, also written as CSV to summary_path if given.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(configs)))
+
+    if workers == 1:
+        results = [run_one(c) for c in configs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(run_one, configs))
+
+    summary = pd.DataFrame(results)
+    if summary_path is not None:
+        os.makedirs(os.path.dirname(os.path.abspath(summary_path)), exist_ok=True)
+        summary.to_csv(summary_path, index=False)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a grid of simulations in parallel.')
+    parser.add_argument('--trace', nargs='+', required=True, help='Job logs (swf)')
+    parser.add_argument('--system', nargs='*', default=[], help='System configs, one for all traces or one per trace. Omit to read the swf header')
+    parser.add_argument('--nodes', nargs='+', type=int, default=[None], help='Node counts overriding the system config')
+    parser.add_argument('--policy', nargs='+', default=['easy'], choices=['easy', 'fcfs'])
+    parser.add_argument('--seed', nargs='+', type=int, default=[0], help='Allocator seeds')
+    parser.add_argument('--out', required=True, help='Root output directory, one sub directory per run')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes, defaults to the number of cores')
+    args = parser.parse_args()
+
+    if len(args.system) not in (0, 1, len(args.trace)):
+        parser.error('Give one system config, one per trace, or none')
+    systems = args.system if len(args.system) == len(args.trace) else (args.system or [None]) * len(args.trace)
+
+    configs = grid(list(zip(args.trace, systems)), args.nodes, args.policy, args.seed, args.out)
+
+    t = time.perf_counter()
+    summary = run_many(configs, args.workers, os.path.join(args.out, 'summary.csv'))
+    elapsed = time.perf_counter() - t
+
+    columns = ['name', 'avg_wait', 'avg_utilization', 'avg_bounded_slowdown', 't_simulate', 't_total']
+    print(summary[[c for c in columns if c in summary]].to_string(index=False))
+    print(f'{len(configs)} runs in {elapsed:.2f} s, summary in {os.path.join(args.out, "summary.csv")}')
+
+    failed = summary[summary['error'].notna()]
+    for _, row in failed.iterrows():
+        print(f'Run {row["name"]} failed:\n{row["error"]}')
+
+
+if __name__ == '__main__':
+    main()
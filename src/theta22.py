@@ -12,4 +12,6 @@ try:
     s.simulate()
 except Exception as e:
     print(e)
+finally:
     s.cleanup()
+
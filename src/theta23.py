@@ -12,4 +12,5 @@ try:
     s.simulate()
 except Exception as e:
     print(e)
-    s.cleanup()
\ No newline at end of file
+finally:
+    s.cleanup()
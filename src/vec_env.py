@@ -0,0 +1,195 @@
+"""
+VecEnv
+
+Steps several independent simulations in lockstep, one worker process each.
+
+Every worker owns one Simulator and advances it from one decision point to
+the next: the point right before an event that runs a scheduling cycle (a
+submit or an end). The observations of all the simulators are written by the
+workers into one shared memory array, so reset() and step() only send a
+short command down each pipe and read the observations back without pickling
+them.
+
+    env = VecEnv([RunConfig(trace, system, f'../data/env/{i}', seed=i) for i in range(8)])
+    obs = env.reset()
+    while not env.dones.all():
+        obs, dones = env.step(np.zeros(env.num_envs, dtype=np.int64))
+    env.close()
+
+Actions are indices into Scheduler.POLICIES, the policy of the coming
+scheduling cycles, or -1 to keep the current one.
+"""
+import multiprocessing as mp
+import os
+import traceback
+
+import numpy as np
+
+from components.scheduler import Scheduler
+from simulator import Simulator
+from sweep import RunConfig
+from windows import read_trace
+
+__metaclass__ = type
+
+# Columns of the observation array, the keys of Simulator.observe()
+OBSERVATION_FIELDS = (
+    'timestamp',
+    'utilization',
+    'avg_wait',
+    'avg_utilization',
+    'avg_bounded_slowdown',
+    'queue_length',
+    'running',
+    'backlog_node_hours',
+)
+
+KEEP_POLICY = -1
+
+
+def _worker(conn, index, config: RunConfig, obs_buffer, done_buffer):
+    """
+    Runs one simulator, serving reset, step and close commands from conn.
+    """
+    obs = np.frombuffer(obs_buffer, dtype=np.float64).reshape(-1, len(OBSERVATION_FIELDS))[index]
+    dones = np.frombuffer(done_buffer, dtype=np.int8)
+    s = None
+
+    def write(done):
+        o = s.observe()
+        obs[:] = [o[k] for k in OBSERVATION_FIELDS]
+        dones[index] = done
+
+    try:
+        df_jobs, system_config = read_trace(config.trace, config.system)
+        if config.nodes is not None:
+            system_config.nodes = config.nodes
+        os.makedirs(config.output_dir, exist_ok=True)
+    except Exception:
+        conn.send(traceback.format_exc())
+        return
+    conn.send(None)
+
+    while True:
+        command, arg = conn.recv()
+        try:
+            if command == 'reset':
+                if s is not None:
+                    s.cleanup()
+                s = Simulator(policy=config.policy, allocator_seed=config.seed, **config.options)
+                s.read_data_frame(df_jobs, system_config)
+                s.initialize(config.output_dir)
+                # NOTE: The first submit is on top of the queue, the first decision point
+                write(False)
+            elif command == 'step':
+                if not dones[index]:
+                    policy = None if arg == KEEP_POLICY else Scheduler.POLICIES[arg]
+                    write(not s.step_to_decision(policy))
+            elif command == 'close':
+                if s is not None:
+                    s.cleanup()
+                conn.send(None)
+                return
+            else:
+                raise ValueError(f'Unknown command {command}')
+        except Exception:
+            conn.send(traceback.format_exc())
+        else:
+            conn.send(None)
+
+
+class VecEnv:
+
+    def __init__(self, configs: list[RunConfig], start_method=None):
+        """
+        One worker process per run config. start_method is passed to
+        multiprocessing.get_context, the platform default if None.
+        """
+        self.num_envs = len(configs)
+        self.configs = configs
+
+        ctx = mp.get_context(start_method)
+        self._obs_buffer = ctx.RawArray('d', self.num_envs * len(OBSERVATION_FIELDS))
+        self._done_buffer = ctx.RawArray('b', self.num_envs)
+
+        # Views of the shared buffers the workers write into
+        self.observations = np.frombuffer(self._obs_buffer, dtype=np.float64).reshape(self.num_envs, len(OBSERVATION_FIELDS))
+        self.dones = np.frombuffer(self._done_buffer, dtype=np.int8).view(bool)
+
+        self._conns = []
+        self._processes = []
+        for i, config in enumerate(configs):
+            parent, child = ctx.Pipe()
+            p = ctx.Process(target=_worker, args=(child, i, config, self._obs_buffer, self._done_buffer), daemon=True)
+            p.start()
+            child.close()
+            self._conns.append(parent)
+            self._processes.append(p)
+        self.closed = False
+
+        # Workers report once their trace is loaded
+        try:
+            self._wait(range(self.num_envs))
+        except RuntimeError:
+            self.close()
+            raise
+
+    def _wait(self, indices):
+        errors = []
+        for i in indices:
+            error = self._conns[i].recv()
+            if error is not None:
+                errors.append(f'Environment {i} ({self.configs[i].name}) failed:\n{error}')
+        if errors:
+            raise RuntimeError('\n'.join(errors))
+
+    def _send(self, command, args, indices):
+        for i, arg in zip(indices, args):
+            self._conns[i].send((command, arg))
+        self._wait(indices)
+
+    def reset(self, indices=None) -> np.ndarray:
+        """
+        Starts the simulations again, all of them or the given ones, and returns the observations.
+        """
+        indices = range(self.num_envs) if indices is None else list(indices)
+        self._send('reset', [None] * len(indices), indices)
+        return self.observations.copy()
+
+    def step(self, actions) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Advances every simulation to its next decision point, each with its action
+        applied first. Simulations already done stay done until reset.
+        Returns the observations and done flags.
+        """
+        actions = np.asarray(actions, dtype=np.int64)
+        if actions.shape != (self.num_envs,):
+            raise ValueError(f'Expected {self.num_envs} actions, got shape {actions.shape}')
+        if ((actions < KEEP_POLICY) | (actions >= len(Scheduler.POLICIES))).any():
+            raise ValueError(f'Actions must be policy indices into {Scheduler.POLICIES} or {KEEP_POLICY}')
+
+        self._send('step', actions.tolist(), range(self.num_envs))
+        return self.observations.copy(), self.dones.copy()
+
+    def close(self):
+        """
+        Flushes the simulations and stops the workers.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        for conn, p in zip(self._conns, self._processes):
+            if p.is_alive():
+                try:
+                    conn.send(('close', None))
+                    conn.recv()
+                except (EOFError, OSError):
+                    pass
+            conn.close()
+            p.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,256 @@
+"""
+Windows
+
+Simulates a long trace as independent time windows in parallel.
+
+The wait and run fields of an swf trace give the real state of the system at
+any instant. Each window starts with the jobs that were actually running or
+queued at its start, simulates the jobs submitted within it (plus an optional
+overlap of later submits that compete with them but are not counted), and runs
+until all of them finished. The per job results of every window are then
+stitched together, each job counted in the window it was submitted in.
+
+Run from src/:
+    python windows.py --trace ../data/theta23/input/theta23.swf --system ../data/theta23/input/system.json \
+        --days 30 --out ../data/theta23/windows
+"""
+import argparse
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from components.scheduler import BSLD_THRESHOLD
+from input_read import DfFileds, read_job_data, read_swf, read_system_config, read_system_config_swf, read_event_data_job_log
+from job_results import read_job_results
+from simulator import Simulator
+
+__metaclass__ = type
+
+DAY = 86400
+
+
+@dataclass
+class WindowConfig:
+
+    index: int
+
+    # Jobs submitted in [start, end) are counted in this window
+    start: int
+    end: int
+
+    trace: str
+    system: str | None
+    output_dir: str
+
+    # Later submits, in [end, end + overlap), simulated but not counted
+    overlap: int = 0
+
+    policy: str = 'easy'
+    seed: int | None = None
+
+    # Extra Simulator keyword arguments
+    options: dict = field(default_factory=dict)
+
+
+def read_trace(trace, system=None):
+    """
+    Returns the jobs and system config of a trace, the config is read from the swf header if system is None.
+    """
+    if system is None:
+        df_jobs, header = read_swf(trace)
+        return df_jobs, read_system_config_swf(header)
+    return read_job_data(trace), read_system_config(system)
+
+def split(df_jobs: pd.DataFrame, length, start=None, end=None) -> list[tuple[int, int]]:
+    """
+    Returns consecutive [start, end) windows of length seconds covering the submit times.
+    """
+    submit = df_jobs[DfFileds.Job.SUBMIT_TS]
+    start = int(submit.min()) if start is None else start
+    end = int(submit.max()) + 1 if end is None else end
+    return [(t, min(t + length, end)) for t in range(start, end, length)]
+
+def warm_state(df_jobs: pd.DataFrame, t) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Returns the jobs running and the jobs queued at time t according to their
+    submit, wait and run fields, both in submit order. Jobs with an unknown wait
+    or run are left out.
+    """
+    submit = df_jobs[DfFileds.Job.SUBMIT_TS]
+    wait = df_jobs[DfFileds.Job.WAIT_T]
+    run = df_jobs[DfFileds.Job.RUN_T]
+    start = submit + wait
+
+    known = (wait >= 0) & (run > 0) & (submit < t)
+    running = df_jobs[known & (start <= t) & (start + run > t)].sort_values(DfFileds.Job.SUBMIT_TS, kind='stable')
+    queued = df_jobs[known & (start > t)].sort_values(DfFileds.Job.SUBMIT_TS, kind='stable')
+    return running, queued
+
+def run_window(config: WindowConfig) -> dict:
+    """
+    Simulates one window and returns its metrics, per phase timings and the
+    results of the jobs counted in it.
+    """
+    result = {
+        'window': config.index,
+        'start': config.start,
+        'end': config.end,
+        'output_dir': config.output_dir,
+    }
+    t_start = time.perf_counter()
+
+    try:
+        os.makedirs(config.output_dir, exist_ok=True)
+        df_all, system_config = read_trace(config.trace, config.system)
+
+        submit = df_all[DfFileds.Job.SUBMIT_TS]
+        arriving = df_all[(submit >= config.start) & (submit < config.end + config.overlap)]
+        running, queued = warm_state(df_all, config.start)
+        df_jobs = pd.concat([running, queued, arriving])
+
+        s = Simulator(policy=config.policy, allocator_seed=config.seed, **config.options)
+        s.read_data_frame(df_jobs, system_config, read_event_data_job_log(arriving))
+        s.initialize(config.output_dir, start_time=config.start)
+        s.warm_start(
+            list(zip(
+                running[DfFileds.Job.ID].tolist(),
+                running[DfFileds.Job.SUBMIT_TS].tolist(),
+                (running[DfFileds.Job.SUBMIT_TS] + running[DfFileds.Job.WAIT_T]).tolist()
+            )),
+            list(zip(queued[DfFileds.Job.ID].tolist(), queued[DfFileds.Job.SUBMIT_TS].tolist()))
+        )
+
+        t = time.perf_counter()
+        # Utilization is measured over the window only
+        s.simulate(until=config.end)
+        busy = s.allocator.busy_node_seconds()
+        s.simulate()
+        result['t_simulate'] = time.perf_counter() - t
+        s.cleanup()
+
+        # Jobs submitted in the window, all finished by now
+        counted = df_all.loc[(submit >= config.start) & (submit < config.end), DfFileds.Job.ID]
+        jobs = read_job_results(os.path.join(config.output_dir, 'jobs')).to_dataframe()
+        jobs = jobs[jobs['id'].isin(counted)].reset_index(drop=True)
+
+        result.update(window_metrics(jobs))
+        result['warm_running'] = len(running)
+        result['warm_queued'] = len(queued)
+        result['nodes'] = system_config.nodes
+        result['busy_node_seconds'] = busy
+        result['utilization'] = busy / (system_config.nodes * (config.end - config.start))
+        result['events'] = s.engine.events_processed
+        result['job_results'] = jobs
+        result['error'] = None
+
+    except Exception:
+        result['error'] = traceback.format_exc()
+
+    result['t_total'] = time.perf_counter() - t_start
+    return result
+
+def window_metrics(jobs: pd.DataFrame) -> dict:
+    """
+    Returns the job count, average wait and average bounded slowdown of finished job results.
+    """
+    wait = jobs['start'] - jobs['submit']
+    runtime = jobs['end'] - jobs['start']
+    bsld = np.maximum((wait + runtime) / np.maximum(runtime, BSLD_THRESHOLD), 1)
+    return {
+        'jobs': len(jobs),
+        'avg_wait': float(wait.mean()) if len(jobs) else 0.0,
+        'avg_bounded_slowdown': float(bsld.mean()) if len(jobs) else 0.0,
+    }
+
+def run_windows(configs: list[WindowConfig], workers=None) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Simulates the windows over a process pool, workers defaults to the number of cores.
+    Returns one row of metrics per window, and the stitched results of every job.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(configs)))
+
+    if workers == 1:
+        results = [run_window(c) for c in configs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(run_window, configs))
+
+    jobs = [r.pop('job_results') for r in results if 'job_results' in r]
+    df_jobs = pd.concat(jobs, ignore_index=True).sort_values('id', ignore_index=True) if jobs else pd.DataFrame()
+    return pd.DataFrame(results), df_jobs
+
+def stitch(summary: pd.DataFrame, df_jobs: pd.DataFrame) -> dict:
+    """
+    Returns the metrics of the whole trace from the windows and their job results.
+    """
+    ok = summary[summary['error'].isna()]
+    duration = (ok['end'] - ok['start']).sum()
+    metrics = window_metrics(df_jobs)
+    metrics['windows'] = len(ok)
+    metrics['utilization'] = float(ok['busy_node_seconds'].sum() / (ok['nodes'] * (ok['end'] - ok['start'])).sum()) if duration else 0.0
+    return metrics
+
+def configs_for(trace, system, out_root, length, overlap=0, policy='easy', seed=None, options=None) -> list[WindowConfig]:
+    """
+    Returns one config per window of length seconds over the trace.
+    """
+    df_jobs, _ = read_trace(trace, system)
+    return [
+        WindowConfig(
+            index=i,
+            start=start,
+            end=end,
+            trace=trace,
+            system=system,
+            output_dir=os.path.join(out_root, f'window_{i:03d}'),
+            overlap=overlap,
+            policy=policy,
+            seed=seed,
+            options=dict(options or {}),
+        )
+        for i, (start, end) in enumerate(split(df_jobs, length))
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate a trace as parallel warm started time windows.')
+    parser.add_argument('--trace', required=True, help='Job log (swf)')
+    parser.add_argument('--system', default=None, help='System config, defaults to the swf header')
+    parser.add_argument('--days', type=float, default=30, help='Length of a window in days')
+    parser.add_argument('--overlap', type=float, default=0, help='Days of later submits simulated after each window without counting them')
+    parser.add_argument('--policy', default='easy', choices=['easy', 'fcfs'])
+    parser.add_argument('--seed', type=int, default=0, help='Allocator seed')
+    parser.add_argument('--out', required=True, help='Root output directory, one sub directory per window')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes, defaults to the number of cores')
+    args = parser.parse_args()
+
+    configs = configs_for(args.trace, args.system, args.out, int(args.days * DAY), int(args.overlap * DAY), args.policy, args.seed)
+
+    t = time.perf_counter()
+    summary, df_jobs = run_windows(configs, args.workers)
+    elapsed = time.perf_counter() - t
+
+    os.makedirs(args.out, exist_ok=True)
+    summary.to_csv(os.path.join(args.out, 'windows.csv'), index=False)
+    df_jobs.to_csv(os.path.join(args.out, 'jobs.csv'), index=False)
+
+    columns = ['window', 'jobs', 'warm_running', 'warm_queued', 'avg_wait', 'avg_bounded_slowdown', 'utilization', 't_simulate']
+    print(summary[[c for c in columns if c in summary]].to_string(index=False))
+    for key, value in stitch(summary, df_jobs).items():
+        print(f'{key}: {value}')
+    print(f'{len(configs)} windows in {elapsed:.2f} s, results in {args.out}')
+
+    failed = summary[summary['error'].notna()]
+    for _, row in failed.iterrows():
+        print(f'Window {row["window"]} failed:\n{row["error"]}')
+
+
+if __name__ == '__main__':
+    main()
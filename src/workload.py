@@ -0,0 +1,316 @@
+"""
+Workload
+
+Synthetic swf workloads.
+
+WorkloadGenerator draws jobs a chunk at a time from an arrival process and
+size, walltime and runtime/walltime ratio distributions. Each chunk is a
+dataframe with the swf_columns of input_read, so a trace of any length is
+written to disk, or streamed into the simulator, in constant memory.
+
+    gen = WorkloadGenerator(nodes=4096, jobs=10_000_000, arrival='diurnal', load=0.9, seed=0)
+    gen.write_swf('synthetic.swf')
+
+    s = Simulator()
+    s.read_data_stream(gen.chunks(), gen.system_config())
+"""
+import math
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+from input_read import SystemConfig, swf_columns
+
+__metaclass__ = type
+
+DAY = 86400
+
+
+# Distributions of the job fields
+
+class Constant:
+    def __init__(self, value):
+        self.value = value
+
+    def sample(self, rng: np.random.Generator, n) -> np.ndarray:
+        return np.full(n, self.value, dtype=np.float64)
+
+    def mean(self) -> float:
+        return float(self.value)
+
+class Uniform:
+    def __init__(self, lo, hi):
+        self.lo = lo
+        self.hi = hi
+
+    def sample(self, rng: np.random.Generator, n) -> np.ndarray:
+        return rng.uniform(self.lo, self.hi, n)
+
+    def mean(self) -> float:
+        return (self.lo + self.hi) / 2
+
+class LogUniform:
+    def __init__(self, lo, hi):
+        if lo <= 0 or hi < lo:
+            raise ValueError(f'LogUniform needs 0 < lo <= hi, got {lo} and {hi}')
+        self.lo = lo
+        self.hi = hi
+
+    def sample(self, rng: np.random.Generator, n) -> np.ndarray:
+        return np.exp(rng.uniform(math.log(self.lo), math.log(self.hi), n))
+
+    def mean(self) -> float:
+        if self.lo == self.hi:
+            return float(self.lo)
+        return (self.hi - self.lo) / math.log(self.hi / self.lo)
+
+class PowerOfTwo:
+    """
+    Powers of two between lo and hi, each exponent equally likely.
+    """
+    def __init__(self, lo, hi):
+        self.lo = int(math.ceil(math.log2(lo)))
+        self.hi = int(math.floor(math.log2(hi)))
+        if self.hi < self.lo:
+            raise ValueError(f'No power of two between {lo} and {hi}')
+
+    def sample(self, rng: np.random.Generator, n) -> np.ndarray:
+        return np.exp2(rng.integers(self.lo, self.hi + 1, n))
+
+    def mean(self) -> float:
+        return float(np.mean(np.exp2(np.arange(self.lo, self.hi + 1))))
+
+class Choice:
+    """
+    Values drawn with the given weights, e.g. the walltimes users usually request.
+    """
+    def __init__(self, values, weights=None):
+        self.values = np.asarray(values, dtype=np.float64)
+        if weights is None:
+            weights = np.ones(len(self.values))
+        weights = np.asarray(weights, dtype=np.float64)
+        self.p = weights / weights.sum()
+
+    def sample(self, rng: np.random.Generator, n) -> np.ndarray:
+        return rng.choice(self.values, n, p=self.p)
+
+    def mean(self) -> float:
+        return float(np.dot(self.values, self.p))
+
+class Beta:
+    """
+    Beta(a, b) scaled to [lo, hi], e.g. for runtime/walltime ratios.
+    """
+    def __init__(self, a, b, lo=0.0, hi=1.0):
+        self.a = a
+        self.b = b
+        self.lo = lo
+        self.hi = hi
+
+    def sample(self, rng: np.random.Generator, n) -> np.ndarray:
+        return self.lo + (self.hi - self.lo) * rng.beta(self.a, self.b, n)
+
+    def mean(self) -> float:
+        return self.lo + (self.hi - self.lo) * self.a / (self.a + self.b)
+
+
+# Arrival processes, rate is the long run mean number of jobs per second
+# NOTE: The processes keep their state between calls, so consecutive
+# chunks continue the same process until reset()
+
+class Poisson:
+    def __init__(self, rate):
+        self.rate = rate
+
+    def reset(self):
+        pass
+
+    def times(self, rng: np.random.Generator, start, n) -> np.ndarray:
+        """
+        Returns the next n arrival times after start.
+        """
+        return start + np.cumsum(rng.exponential(1 / self.rate, n))
+
+class Diurnal:
+    """
+    Poisson arrivals whose rate follows a daily sine, highest at peak_hour.
+    """
+    def __init__(self, rate, amplitude=0.5, peak_hour=14):
+        if not 0 <= amplitude <= 1:
+            raise ValueError(f'Amplitude must be in [0, 1], got {amplitude}')
+        self.rate = rate
+        self.amplitude = amplitude
+        self.peak = peak_hour * 3600
+
+    def reset(self):
+        pass
+
+    def _rate(self, t):
+        return self.rate * (1 + self.amplitude * np.cos(2 * np.pi * (t - self.peak) / DAY))
+
+    def times(self, rng: np.random.Generator, start, n) -> np.ndarray:
+        # Thinning: candidates at the peak rate, each kept with probability rate(t) / peak rate
+        rate_max = self.rate * (1 + self.amplitude)
+        accepted = []
+        count = 0
+        while count < n:
+            m = int((n - count) * (1 + self.amplitude) * 1.1) + 16
+            candidates = start + np.cumsum(rng.exponential(1 / rate_max, m))
+            kept = candidates[rng.uniform(0, rate_max, m) < self._rate(candidates)]
+            accepted.append(kept[:n - count])
+            count += len(accepted[-1])
+            start = candidates[-1]
+        return np.concatenate(accepted)
+
+class Bursty:
+    """
+    Arrivals alternating between calm and burst periods (a Markov modulated
+    Poisson process). A calm arrival starts a burst with probability p_burst,
+    bursts last mean_burst_jobs arrivals on average and arrive burst_factor
+    times faster.
+    """
+    def __init__(self, rate, burst_factor=10, p_burst=0.01, mean_burst_jobs=50):
+        self.rate = rate
+        self.burst_factor = burst_factor
+        self.p_burst = p_burst
+        self.p_calm = 1 / mean_burst_jobs
+
+        # Calm rate giving the requested mean rate
+        share_burst = p_burst / (p_burst + self.p_calm)
+        self.rate_calm = rate * ((1 - share_burst) + share_burst / burst_factor)
+
+        self.reset()
+
+    def reset(self):
+        # Current state and the arrivals left in it, the first period is calm
+        self._burst = True
+        self._left = 0
+
+    def _states(self, rng: np.random.Generator, n) -> np.ndarray:
+        states = []
+        count = 0
+        while count < n:
+            if self._left == 0:
+                self._burst = not self._burst
+                self._left = int(rng.geometric(self.p_calm if self._burst else self.p_burst))
+            k = min(self._left, n - count)
+            states.append(np.full(k, self._burst))
+            self._left -= k
+            count += k
+        return np.concatenate(states)
+
+    def times(self, rng: np.random.Generator, start, n) -> np.ndarray:
+        burst = self._states(rng, n)
+        scale = np.where(burst, 1 / (self.rate_calm * self.burst_factor), 1 / self.rate_calm)
+        return start + np.cumsum(rng.exponential(1.0, n) * scale)
+
+ARRIVALS = {
+    'poisson': Poisson,
+    'diurnal': Diurnal,
+    'bursty': Bursty,
+}
+
+
+class WorkloadGenerator:
+
+    def __init__(
+        self,
+        nodes,
+        jobs=None,
+        arrival='poisson',
+        load=0.8,
+        size=None,
+        walltime=None,
+        runtime_ratio=None,
+        start_time=0,
+        seed=None,
+        chunk_size=1 << 16
+    ):
+        """
+        Jobs for a system of nodes, endless if jobs is None.
+
+        arrival is a process instance, or the name of one in ARRIVALS whose rate
+        is set so the offered load (node seconds asked per node second) is load.
+        size, walltime and runtime_ratio default to powers of two up to nodes,
+        log-uniform walltimes from 10 minutes to a day, and uniform ratios in [0.1, 1].
+        """
+        self.nodes = nodes
+        self.jobs = jobs
+        self.size = size if size is not None else PowerOfTwo(1, nodes)
+        self.walltime = walltime if walltime is not None else LogUniform(600, DAY)
+        self.runtime_ratio = runtime_ratio if runtime_ratio is not None else Uniform(0.1, 1.0)
+        self.start_time = start_time
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.load = load
+
+        if isinstance(arrival, str):
+            if arrival not in ARRIVALS:
+                raise ValueError(f'Unknown arrival process {arrival}, expected one of {list(ARRIVALS)}')
+            node_seconds = self.size.mean() * self.walltime.mean() * min(self.runtime_ratio.mean(), 1.0)
+            arrival = ARRIVALS[arrival](rate=load * nodes / node_seconds)
+        self.arrival = arrival
+
+    def system_config(self) -> SystemConfig:
+        return SystemConfig(nodes=self.nodes, ppn=1)
+
+    def header(self) -> dict[str, str]:
+        """
+        Returns the swf header fields of the workload.
+        """
+        header = {
+            'Version': '2.2',
+            'Note': f'Synthetic workload, {type(self.arrival).__name__} arrivals, load {self.load}, seed {self.seed}',
+            'MaxNodes': str(self.nodes),
+            'MaxProcs': str(self.nodes),
+        }
+        if self.jobs is not None:
+            header['MaxJobs'] = str(self.jobs)
+        return header
+
+    def chunks(self) -> Iterator[pd.DataFrame]:
+        """
+        Yields the jobs as dataframes of chunk_size rows with the swf columns, sorted by submit time.
+        """
+        # Each call replays the same workload
+        rng = np.random.default_rng(self.seed)
+        arrival = self.arrival
+        arrival.reset()
+
+        start = float(self.start_time)
+        job_id = 1
+        while self.jobs is None or job_id <= self.jobs:
+            n = self.chunk_size if self.jobs is None else min(self.chunk_size, self.jobs - job_id + 1)
+
+            submits = arrival.times(rng, start, n)
+            start = submits[-1]
+
+            sizes = np.clip(self.size.sample(rng, n), 1, self.nodes).astype(np.int64)
+            walltimes = np.maximum(self.walltime.sample(rng, n), 1).astype(np.int64)
+            runtimes = np.clip(walltimes * self.runtime_ratio.sample(rng, n), 1, walltimes).astype(np.int64)
+
+            chunk = pd.DataFrame({c: np.full(n, -1, dtype=np.int64) for c in swf_columns})
+            chunk['id'] = np.arange(job_id, job_id + n, dtype=np.int64)
+            chunk['submit'] = submits.astype(np.int64)
+            chunk['run'] = runtimes
+            chunk['used_proc'] = sizes
+            chunk['req_proc'] = sizes
+            chunk['req_time'] = walltimes
+            chunk['status'] = 1
+            yield chunk
+
+            job_id += n
+
+    def write_swf(self, path):
+        """
+        Writes the workload as an swf file, one chunk at a time.
+        """
+        if self.jobs is None:
+            raise ValueError('Can not write an endless workload, set jobs')
+
+        with open(path, 'w') as f:
+            for key, value in self.header().items():
+                f.write(f'; {key}: {value}\n')
+            for chunk in self.chunks():
+                np.savetxt(f, chunk.to_numpy(), fmt='%d')